@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""Throughput / latency / memory benchmark for all CS1 implementations.
+
+Runs ReferenceCitationRenumberer and every implementation under
+implementations/cs1/ over synthetic token streams (see cs1_streams.py) and
+records, per implementation and stream shape:
+
+  - tokens_per_sec : whole-stream throughput including get_source_list()
+  - p50_us / p99_us: per-token process_token latency in microseconds
+  - peak_kib       : tracemalloc peak over one full stream
+
+Usage:
+    python3 paper/downstream/benchmarks/bench_cs1.py
+    python3 paper/downstream/benchmarks/bench_cs1.py --token-size 1 4 64 \\
+        --citation-density 0.02 0.2 --distinct-sources 10 --split-frequency 0 1
+
+Output: paper/downstream/results/bench_cs1.json
+"""
+
+import argparse
+import itertools
+import json
+import time
+import tracemalloc
+from pathlib import Path
+
+from cs1_impls import load_cs1_implementations
+from cs1_streams import StreamConfig, make_stream
+
+RESULTS_DIR = Path(__file__).parent.parent / "results"
+REPEATS = 3
+
+
+def percentile(sorted_vals: list[float], q: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_vals:
+        return 0.0
+    idx = min(len(sorted_vals) - 1, max(0, round(q * len(sorted_vals)) - 1))
+    return sorted_vals[idx]
+
+
+def measure_throughput(factory, tokens: list[str]) -> float:
+    best = float("inf")
+    for _ in range(REPEATS):
+        r = factory()
+        start = time.perf_counter()
+        for token in tokens:
+            r.process_token(token)
+        r.get_source_list()
+        best = min(best, time.perf_counter() - start)
+    return len(tokens) / best
+
+
+def measure_latency(factory, tokens: list[str]) -> tuple[float, float]:
+    r = factory()
+    clock = time.perf_counter_ns
+    samples: list[int] = []
+    for token in tokens:
+        start = clock()
+        r.process_token(token)
+        samples.append(clock() - start)
+    samples.sort()
+    return percentile(samples, 0.50) / 1000, percentile(samples, 0.99) / 1000
+
+
+def measure_peak_memory(factory, tokens: list[str]) -> float:
+    tracemalloc.start()
+    try:
+        r = factory()
+        for token in tokens:
+            r.process_token(token)
+        r.get_source_list()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak / 1024
+
+
+def run(configs: list[StreamConfig]) -> list[dict]:
+    factories = load_cs1_implementations()
+    results = []
+    for config in configs:
+        tokens = make_stream(config)
+        print(f"\n{config.label} ({len(tokens)} tokens)")
+        print(f"{'Implementation':<26} {'Tokens/sec':>12} {'p50 us':>8} {'p99 us':>8} {'Peak KiB':>9}")
+        for name, factory in factories.items():
+            try:
+                tps = measure_throughput(factory, tokens)
+                p50, p99 = measure_latency(factory, tokens)
+                peak = measure_peak_memory(factory, tokens)
+            except Exception as e:
+                print(f"{name:<26} ERROR: {e}")
+                results.append({"impl": name, "config": config.label, "error": str(e)})
+                continue
+            print(f"{name:<26} {tps:>12,.0f} {p50:>8.2f} {p99:>8.2f} {peak:>9.1f}")
+            results.append({
+                "impl": name,
+                "config": config.label,
+                "token_size": config.token_size,
+                "citation_density": config.citation_density,
+                "distinct_sources": config.distinct_sources,
+                "split_frequency": config.split_frequency,
+                "tokens": len(tokens),
+                "tokens_per_sec": tps,
+                "p50_us": p50,
+                "p99_us": p99,
+                "peak_kib": peak,
+            })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--token-size", type=int, nargs="+", default=[1, 4, 64])
+    parser.add_argument("--citation-density", type=float, nargs="+", default=[0.05])
+    parser.add_argument("--distinct-sources", type=int, nargs="+", default=[10])
+    parser.add_argument("--split-frequency", type=float, nargs="+", default=[0.5])
+    parser.add_argument("--chars", type=int, default=StreamConfig.n_chars)
+    parser.add_argument("--output", type=Path, default=RESULTS_DIR / "bench_cs1.json")
+    args = parser.parse_args()
+
+    configs = [
+        StreamConfig(token_size=t, citation_density=d, distinct_sources=s, split_frequency=f, n_chars=args.chars)
+        for t, d, s, f in itertools.product(
+            args.token_size, args.citation_density, args.distinct_sources, args.split_frequency
+        )
+    ]
+    results = run(configs)
+
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump({"repeats": REPEATS, "results": results}, f, indent=2)
+    print(f"\nResults saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""Pathological-input benchmark for the CS1 stream parsers.
+
+Feeds adversarial token streams of growing length to:
+  - StreamParser (regex tail search over the held-back buffer)
+  - CitationScanner (state machine, unbounded digit runs)
+  - CitationScanner(max_digits=9) (state machine, bounded lookahead)
+
+and records total time, ns per token and the held-back buffer high-water
+mark. Linear parsers show constant ns/token as the stream grows; a bounded
+parser also shows a constant high-water mark.
+
+Inputs:
+  digit_flood   "source_" followed by one digit per token
+  prefix_storm  "sour" repeated: every token reopens a partial prefix
+  prefix_chain  "source_" repeated: each prefix fails on the next one
+
+Usage:
+    python3 paper/downstream/benchmarks/bench_cs1_adversarial.py
+
+Output: paper/downstream/results/bench_cs1_adversarial.json
+"""
+
+import json
+import sys
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).parent.parent
+RESULTS_DIR = BASE_DIR / "results"
+sys.path.insert(0, str(BASE_DIR))
+
+from runtime.cs1_scanner import CitationScanner
+from runtime.cs1_stream import StreamParser
+
+LENGTHS = [1_000, 4_000, 16_000]
+MAX_DIGITS = 9
+
+INPUTS = {
+    "digit_flood": lambda n: ["source_"] + ["7"] * (n - 1),
+    "prefix_storm": lambda n: ["sour"] * n,
+    "prefix_chain": lambda n: ["source_"] * n,
+}
+
+CANDIDATES = {
+    "StreamParser": StreamParser,
+    "CitationScanner": CitationScanner,
+    f"CitationScanner(max_digits={MAX_DIGITS})": lambda: CitationScanner(max_digits=MAX_DIGITS),
+}
+
+
+def run_once(factory, tokens: list[str]) -> tuple[float, int]:
+    """Return (seconds, held-back high-water mark) for one pass over tokens."""
+    parser = factory()
+    high_water = 0
+    start = time.perf_counter()
+    for token in tokens:
+        parser.feed(token)
+        pending = len(parser.pending)
+        if pending > high_water:
+            high_water = pending
+    parser.flush()
+    return time.perf_counter() - start, high_water
+
+
+def main():
+    RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+    results = []
+    print(f"{'Input':<14} {'Candidate':<30} {'Tokens':>7} {'ns/token':>10} {'Max held':>9}")
+    for input_name, make in INPUTS.items():
+        for name, factory in CANDIDATES.items():
+            for n in LENGTHS:
+                tokens = make(n)
+                seconds, high_water = run_once(factory, tokens)
+                ns_per_token = seconds * 1e9 / n
+                results.append({
+                    "input": input_name,
+                    "candidate": name,
+                    "tokens": n,
+                    "seconds": seconds,
+                    "ns_per_token": ns_per_token,
+                    "max_pending": high_water,
+                })
+                print(f"{input_name:<14} {name:<30} {n:>7} {ns_per_token:>10,.0f} {high_water:>9}")
+
+    with open(RESULTS_DIR / "bench_cs1_adversarial.json", "w") as f:
+        json.dump({"max_digits": MAX_DIGITS, "results": results}, f, indent=2)
+    print(f"\nResults saved to {RESULTS_DIR / 'bench_cs1_adversarial.json'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""Added per-chunk latency of CitationRenumberMiddleware.
+
+An in-process ASGI test client calls a streaming app directly, with and
+without the middleware. The app sends a cs1_streams token stream as SSE
+events, one token per http.response.body chunk, and stamps each message
+just before send(); the client stamps it on arrival. The difference is the
+time spent between the app and the client, so the middleware's added
+latency per chunk is its p50 / p99 minus the bare app's.
+
+Usage:
+    python3 paper/downstream/benchmarks/bench_cs1_asgi.py
+
+Output: paper/downstream/results/bench_cs1_asgi.json
+"""
+
+import asyncio
+import json
+import sys
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).parent.parent
+RESULTS_DIR = BASE_DIR / "results"
+sys.path.insert(0, str(BASE_DIR))
+
+from runtime.cs1_asgi import CitationRenumberMiddleware
+
+from bench_cs1 import percentile
+from cs1_streams import StreamConfig, make_stream
+
+TOKEN_SIZES = [4, 64]
+TEXT_CHARS = 100_000
+REPEATS = 3
+
+
+def sse_app(tokens: list[str], stamps: list[int]):
+    events = [f"data: {token}\n\n".encode() for token in tokens]
+
+    async def app(scope, receive, send):
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [(b"content-type", b"text/event-stream")],
+        })
+        clock = time.perf_counter_ns
+        last = len(events) - 1
+        for i, body in enumerate(events):
+            stamps.append(clock())
+            await send({"type": "http.response.body", "body": body, "more_body": i < last})
+
+    return app
+
+
+async def request(app, arrivals: list[int]) -> None:
+    clock = time.perf_counter_ns
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.body":
+            arrivals.append(clock())
+
+    await app({"type": "http", "method": "GET", "path": "/"}, receive, send)
+
+
+def measure(tokens: list[str], wrap: bool) -> tuple[float, float, float]:
+    """Return (p50 us, p99 us, chunks/sec) of app-to-client chunk latency."""
+    best = None
+    for _ in range(REPEATS):
+        stamps: list[int] = []
+        arrivals: list[int] = []
+        app = sse_app(tokens, stamps)
+        if wrap:
+            app = CitationRenumberMiddleware(app)
+        start = time.perf_counter()
+        asyncio.run(request(app, arrivals))
+        elapsed = time.perf_counter() - start
+        # A chunk held back by the middleware arrives with a later one.
+        latencies = []
+        j = 0
+        for stamp in stamps:
+            while arrivals[j] < stamp:
+                j += 1
+            latencies.append(arrivals[j] - stamp)
+        latencies.sort()
+        run = (percentile(latencies, 0.50) / 1000, percentile(latencies, 0.99) / 1000, len(tokens) / elapsed)
+        if best is None or run[0] < best[0]:
+            best = run
+    return best
+
+
+def main():
+    RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+    results = []
+    print(f"{'Token':>6} {'App':<12} {'p50 us':>8} {'p99 us':>8} {'Chunks/sec':>12}")
+    for size in TOKEN_SIZES:
+        tokens = make_stream(StreamConfig(token_size=size, citation_density=0.1, n_chars=TEXT_CHARS))
+        for name, wrap in (("bare", False), ("middleware", True)):
+            p50, p99, cps = measure(tokens, wrap)
+            results.append({"token_size": size, "app": name, "p50_us": p50, "p99_us": p99, "chunks_per_sec": cps})
+            print(f"{size:>6} {name:<12} {p50:>8.2f} {p99:>8.2f} {cps:>12,.0f}")
+        bare, wrapped = results[-2], results[-1]
+        print(f"{'':>6} added p50 {wrapped['p50_us'] - bare['p50_us']:.2f} us, "
+              f"p99 {wrapped['p99_us'] - bare['p99_us']:.2f} us")
+
+    with open(RESULTS_DIR / "bench_cs1_asgi.json", "w") as f:
+        json.dump({"text_chars": TEXT_CHARS, "results": results}, f, indent=2)
+    print(f"\nResults saved to {RESULTS_DIR / 'bench_cs1_asgi.json'}")
+
+
+if __name__ == "__main__":
+    main()
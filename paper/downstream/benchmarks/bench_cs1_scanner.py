@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""Benchmark the incremental CitationScanner against the regex parsers.
+
+Compares tokens/sec at 1-, 4- and 64-character token sizes for:
+  - StreamParser (regex tail search, split-boundary aware)
+  - CitationScanner (state machine, split-boundary aware)
+  - ReferenceCitationRenumberer (per-token re.sub)
+  - CitationScanner(hold=False) (state machine, per-token)
+
+Usage:
+    python3 paper/downstream/benchmarks/bench_cs1_scanner.py
+
+Output: paper/downstream/results/bench_cs1_scanner.json
+"""
+
+import json
+import sys
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).parent.parent
+RESULTS_DIR = BASE_DIR / "results"
+sys.path.insert(0, str(BASE_DIR))
+sys.path.insert(0, str(BASE_DIR / "tests"))
+
+from reference_cs1 import ReferenceCitationRenumberer
+from runtime.cs1_scanner import CitationScanner
+from runtime.cs1_stream import StreamParser
+
+from cs1_streams import StreamConfig, make_stream
+
+TEXT_CHARS = 200_000
+TOKEN_SIZES = [1, 4, 64]
+REPEATS = 3
+
+
+def _parser_runner(factory):
+    def run(tokens):
+        parser = factory()
+        for token in tokens:
+            parser.feed(token)
+        parser.flush()
+    return run
+
+
+def _reference_runner(tokens):
+    r = ReferenceCitationRenumberer()
+    for token in tokens:
+        r.process_token(token)
+
+
+CANDIDATES = {
+    "StreamParser": _parser_runner(StreamParser),
+    "CitationScanner": _parser_runner(CitationScanner),
+    "Reference re.sub": _reference_runner,
+    "CitationScanner(hold=False)": _parser_runner(lambda: CitationScanner(hold=False)),
+}
+
+
+def main():
+    RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+    results = []
+    print(f"{'Candidate':<30} {'Token':>6} {'Tokens/sec':>14}")
+    for size in TOKEN_SIZES:
+        tokens = make_stream(StreamConfig(token_size=size, citation_density=0.1, n_chars=TEXT_CHARS))
+        for name, run in CANDIDATES.items():
+            best = float("inf")
+            for _ in range(REPEATS):
+                start = time.perf_counter()
+                run(tokens)
+                best = min(best, time.perf_counter() - start)
+            tps = len(tokens) / best
+            results.append({"candidate": name, "token_size": size, "tokens": len(tokens), "tokens_per_sec": tps})
+            print(f"{name:<30} {size:>6} {tps:>14,.0f}")
+
+    with open(RESULTS_DIR / "bench_cs1_scanner.json", "w") as f:
+        json.dump({"text_chars": TEXT_CHARS, "results": results}, f, indent=2)
+    print(f"\nResults saved to {RESULTS_DIR / 'bench_cs1_scanner.json'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""Contention benchmark for SharedCitationRegistry.
+
+Runs 1..64 concurrent producer threads, each renumbering its own stream
+with a StreamingRenumberer that numbers into one SharedCitationRegistry,
+and records aggregate tokens/sec per producer count. Streams draw from a
+common pool of source ids, so producers race to allocate the same ids.
+The resulting numbering is checked to be dense and duplicate-free.
+
+Usage:
+    python3 paper/downstream/benchmarks/bench_cs1_shared.py
+
+Output: paper/downstream/results/bench_cs1_shared.json
+"""
+
+import json
+import sys
+import threading
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).parent.parent
+RESULTS_DIR = BASE_DIR / "results"
+sys.path.insert(0, str(BASE_DIR))
+
+from runtime.cs1_shared import SharedCitationRegistry
+from runtime.cs1_stream import StreamingRenumberer
+
+from cs1_streams import StreamConfig, make_stream
+
+PRODUCERS = [1, 2, 4, 8, 16, 32, 64]
+TOTAL_CHARS = 400_000
+DISTINCT_SOURCES = 50
+
+
+def run(n_producers: int) -> tuple[float, int]:
+    """Return (aggregate tokens/sec, sources allocated) for n_producers."""
+    chars = TOTAL_CHARS // n_producers
+    streams = [
+        make_stream(StreamConfig(citation_density=0.2, distinct_sources=DISTINCT_SOURCES, n_chars=chars, seed=i))
+        for i in range(n_producers)
+    ]
+    registry = SharedCitationRegistry()
+    barrier = threading.Barrier(n_producers + 1)
+
+    def produce(tokens):
+        r = StreamingRenumberer(registry=registry)
+        barrier.wait()
+        for token in tokens:
+            r.process_token(token)
+        r.flush()
+
+    threads = [threading.Thread(target=produce, args=(tokens,)) for tokens in streams]
+    for t in threads:
+        t.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    ordered = registry.get_ordered()
+    assert [num for num, _ in ordered] == list(range(1, len(ordered) + 1))
+    assert len({sid for _, sid in ordered}) == len(ordered)
+    return sum(len(tokens) for tokens in streams) / elapsed, len(ordered)
+
+
+def main():
+    RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+    results = []
+    print(f"{'Producers':>9} {'Tokens/sec':>14} {'Sources':>8}")
+    for n in PRODUCERS:
+        tps, sources = run(n)
+        results.append({"producers": n, "tokens_per_sec": tps, "sources": sources})
+        print(f"{n:>9} {tps:>14,.0f} {sources:>8}")
+
+    with open(RESULTS_DIR / "bench_cs1_shared.json", "w") as f:
+        json.dump({"total_chars": TOTAL_CHARS, "distinct_sources": DISTINCT_SOURCES, "results": results}, f, indent=2)
+    print(f"\nResults saved to {RESULTS_DIR / 'bench_cs1_shared.json'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""Benchmark sink-based CS1 output against the return-value API.
+
+Renumbers long answers with FastCitationRenumberer and writes the output to
+an io.StringIO, either through process_token() return values or through
+bind_sink(). Records tokens/sec at 4- and 64-character token sizes. Encoding
+process_token() output into a bytearray is recorded as the byte-buffer
+baseline: a UTF-8 bind_sink() path was measured slower than it and removed.
+
+Usage:
+    python3 paper/downstream/benchmarks/bench_cs1_sink.py
+
+Output: paper/downstream/results/bench_cs1_sink.json
+"""
+
+import io
+import json
+import sys
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).parent.parent
+RESULTS_DIR = BASE_DIR / "results"
+sys.path.insert(0, str(BASE_DIR))
+
+from runtime.cs1_alloc import FastCitationRenumberer
+
+from cs1_streams import StreamConfig, make_stream
+
+TEXT_CHARS = 500_000
+TOKEN_SIZES = [4, 64]
+REPEATS = 3
+
+
+def _return_text(tokens):
+    r, out = FastCitationRenumberer(), io.StringIO()
+    for token in tokens:
+        out.write(r.process_token(token))
+
+
+def _sink_text(tokens):
+    feed = FastCitationRenumberer().bind_sink(io.StringIO())
+    for token in tokens:
+        feed(token)
+
+
+def _return_bytes(tokens):
+    r, buf = FastCitationRenumberer(), bytearray()
+    for token in tokens:
+        buf += r.process_token(token).encode()
+
+
+CANDIDATES = {
+    "return -> StringIO": _return_text,
+    "bind_sink(StringIO)": _sink_text,
+    "return -> bytearray": _return_bytes,
+}
+
+
+def main():
+    RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+    results = []
+    print(f"{'Candidate':<24} {'Token':>6} {'Tokens/sec':>14}")
+    for size in TOKEN_SIZES:
+        tokens = make_stream(StreamConfig(token_size=size, citation_density=0.1, n_chars=TEXT_CHARS))
+        for name, run in CANDIDATES.items():
+            best = float("inf")
+            for _ in range(REPEATS):
+                start = time.perf_counter()
+                run(tokens)
+                best = min(best, time.perf_counter() - start)
+            tps = len(tokens) / best
+            results.append({"candidate": name, "token_size": size, "tokens": len(tokens), "tokens_per_sec": tps})
+            print(f"{name:<24} {size:>6} {tps:>14,.0f}")
+
+    with open(RESULTS_DIR / "bench_cs1_sink.json", "w") as f:
+        json.dump({"text_chars": TEXT_CHARS, "results": results}, f, indent=2)
+    print(f"\nResults saved to {RESULTS_DIR / 'bench_cs1_sink.json'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""User-level revocation latency: full scan vs per-user index.
+
+Fills ReferenceSessionManager and IndexedSessionManager with up to 10^6
+sessions (users across tenants, DEVICES sessions each), then revokes
+REVOCATIONS random users and records per-revocation latency. Session
+creation and validation throughput are recorded too, to show what the
+index costs on the hot paths.
+
+Usage:
+    python3 paper/downstream/benchmarks/bench_cs2_sessions.py
+
+Output: paper/downstream/results/bench_cs2_sessions.json
+"""
+
+import gc
+import json
+import random
+import sys
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).parent.parent
+RESULTS_DIR = BASE_DIR / "results"
+sys.path.insert(0, str(BASE_DIR))
+sys.path.insert(0, str(BASE_DIR / "tests"))
+
+from runtime.cs2_sessions import IndexedSessionManager
+
+from bench_cs1 import percentile
+from reference_cs2 import ReferenceSessionManager
+
+SESSION_COUNTS = [10_000, 100_000, 1_000_000]
+TENANTS = 100
+DEVICES = 4
+REVOCATIONS = 20
+VALIDATIONS = 100_000
+
+MANAGERS = {
+    "reference": ReferenceSessionManager,
+    "indexed": IndexedSessionManager,
+}
+
+
+def run(factory, n_sessions: int) -> dict:
+    n_users = n_sessions // DEVICES
+    sm = factory()
+    tokens = []
+    start = time.perf_counter()
+    for i in range(n_users):
+        tenant, user = f"tenant_{i % TENANTS}", f"user_{i}"
+        for d in range(DEVICES):
+            tokens.append(sm.create_session(tenant, user, f"device_{d}"))
+    create_s = time.perf_counter() - start
+
+    rng = random.Random(0)
+    sample = rng.sample(tokens, min(VALIDATIONS, len(tokens)))
+    start = time.perf_counter()
+    for token in sample:
+        sm.validate_session(token)
+    validate_s = time.perf_counter() - start
+
+    latencies = []
+    for i in rng.sample(range(n_users), REVOCATIONS):
+        start = time.perf_counter_ns()
+        revoked = sm.invalidate_user_sessions(f"tenant_{i % TENANTS}", f"user_{i}")
+        latencies.append(time.perf_counter_ns() - start)
+        assert revoked == DEVICES
+    latencies.sort()
+    return {
+        "creates_per_sec": len(tokens) / create_s,
+        "validations_per_sec": len(sample) / validate_s,
+        "revoke_p50_us": percentile(latencies, 0.50) / 1000,
+        "revoke_max_us": latencies[-1] / 1000,
+    }
+
+
+def main():
+    RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+    results = []
+    print(f"{'Sessions':>10} {'Manager':<10} {'Creates/sec':>12} {'Validates/sec':>14} "
+          f"{'Revoke p50 us':>14} {'Revoke max us':>14}")
+    for n in SESSION_COUNTS:
+        for name, factory in MANAGERS.items():
+            entry = run(factory, n)
+            gc.collect()
+            results.append({"sessions": n, "manager": name, **entry})
+            print(f"{n:>10,} {name:<10} {entry['creates_per_sec']:>12,.0f} {entry['validations_per_sec']:>14,.0f} "
+                  f"{entry['revoke_p50_us']:>14,.1f} {entry['revoke_max_us']:>14,.1f}")
+
+    with open(RESULTS_DIR / "bench_cs2_sessions.json", "w") as f:
+        json.dump({"tenants": TENANTS, "devices": DEVICES, "results": results}, f, indent=2)
+    print(f"\nResults saved to {RESULTS_DIR / 'bench_cs2_sessions.json'}")
+
+
+if __name__ == "__main__":
+    main()
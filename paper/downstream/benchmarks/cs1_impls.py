@@ -0,0 +1,63 @@
+"""Load every CS1 implementation plus the reference for benchmarking.
+
+Implementations are located the way test_cs1.py does it: the first class
+in the module with process_token and get_source_list that can be
+constructed without arguments.
+"""
+
+import importlib.util
+import sys
+from collections.abc import Callable
+from pathlib import Path
+
+BASE_DIR = Path(__file__).parent.parent
+IMPL_DIR = BASE_DIR / "implementations" / "cs1"
+sys.path.insert(0, str(BASE_DIR))
+sys.path.insert(0, str(BASE_DIR / "tests"))
+
+from reference_cs1 import ReferenceCitationRenumberer
+
+REFERENCE_NAME = "reference"
+
+
+def _renumberer_factory(module) -> Callable[[], object] | None:
+    for name in dir(module):
+        obj = getattr(module, name)
+        if (
+            isinstance(obj, type)
+            and hasattr(obj, "process_token")
+            and hasattr(obj, "get_source_list")
+        ):
+            try:
+                obj()
+            except TypeError:
+                continue  # abstract class or required arguments
+            return obj
+    return None
+
+
+def load_module(path: Path):
+    spec = importlib.util.spec_from_file_location(f"cs1_impl_{path.stem.replace('-', '_')}", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def load_cs1_implementations(impl_dir: Path = IMPL_DIR) -> dict[str, Callable[[], object]]:
+    """Return {name: factory} for the reference and every file in impl_dir.
+
+    Names are file stems (e.g. "cs1-pdd-template-run4"); files that fail to
+    import or define no usable class are reported on stderr and skipped.
+    """
+    factories: dict[str, Callable[[], object]] = {REFERENCE_NAME: ReferenceCitationRenumberer}
+    for path in sorted(impl_dir.glob("*.py")):
+        try:
+            factory = _renumberer_factory(load_module(path))
+        except Exception as e:
+            print(f"skipping {path.name}: {e}", file=sys.stderr)
+            continue
+        if factory is None:
+            print(f"skipping {path.name}: no CitationRenumberer found", file=sys.stderr)
+            continue
+        factories[path.stem] = factory
+    return factories
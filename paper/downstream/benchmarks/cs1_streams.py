@@ -0,0 +1,75 @@
+"""Synthetic CS1 token streams for benchmarks.
+
+A stream is answer-like text with source_N citations, cut into tokens.
+StreamConfig controls the shape that matters for renumbering cost:
+
+    token_size         : characters per token (before forced splits)
+    citation_density   : probability that a word is a citation
+    distinct_sources   : N is drawn from source_1 .. source_<distinct_sources>
+    split_frequency    : fraction of citations cut by a token boundary;
+                         the remaining citations are kept whole
+"""
+
+import random
+from dataclasses import dataclass
+
+WORDS = [
+    "the", "results", "show", "that", "retrieval", "supports", "this", "claim",
+    "see", "also", "so", "as", "reported", "in", "prior", "work", "and", "is",
+]
+
+
+@dataclass(frozen=True)
+class StreamConfig:
+    token_size: int = 4
+    citation_density: float = 0.05
+    distinct_sources: int = 10
+    split_frequency: float = 0.5
+    n_chars: int = 20_000
+    seed: int = 42
+
+    @property
+    def label(self) -> str:
+        return (
+            f"tok{self.token_size}-dens{self.citation_density:g}"
+            f"-src{self.distinct_sources}-split{self.split_frequency:g}"
+        )
+
+
+def make_text(config: StreamConfig, rng: random.Random) -> tuple[str, list[tuple[int, int]]]:
+    """Return (text, citation spans) for config."""
+    parts: list[str] = []
+    spans: list[tuple[int, int]] = []
+    size = 0
+    while size < config.n_chars:
+        if rng.random() < config.citation_density:
+            word = f"source_{rng.randint(1, config.distinct_sources)}"
+            spans.append((size, size + len(word)))
+        else:
+            word = rng.choice(WORDS)
+        parts.append(word)
+        size += len(word) + 1
+    return " ".join(parts), spans
+
+
+def tokenize(text: str, size: int) -> list[str]:
+    """Cut text into fixed-size tokens."""
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+def make_stream(config: StreamConfig) -> list[str]:
+    """Generate the token stream described by config."""
+    rng = random.Random(config.seed)
+    text, spans = make_text(config, rng)
+    cuts = set(range(config.token_size, len(text), config.token_size))
+    for start, end in spans:
+        inside = [c for c in cuts if start < c < end]
+        if rng.random() < config.split_frequency:
+            if not inside:
+                cuts.add(rng.randint(start + 1, end - 1))
+        else:
+            cuts.difference_update(inside)
+            if inside:
+                cuts.add(end)
+    bounds = [0] + sorted(c for c in cuts if c < len(text)) + [len(text)]
+    return [text[a:b] for a, b in zip(bounds, bounds[1:])]
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""Recorded CS1 token streams with arrival timestamps.
+
+Synthetic streams (cs1_streams.py) arrive all at once; real model output
+arrives in bursts separated by pauses, and that timing decides how long a
+held-back citation stays invisible. A trace is a JSONL file with one token
+per line and the arrival time in seconds since the stream started:
+
+    {"t": 0.000, "token": "The results"}
+    {"t": 0.021, "token": " show source"}
+    {"t": 0.187, "token": "_3 and"}
+
+Times must be non-decreasing. An optional first line {"trace": {...}}
+carries metadata (model, prompt id, ...) and is ignored on replay.
+
+TraceRecorder captures a live stream into this format. For trying the
+replay driver without recorded data, the synth command writes traces whose
+text comes from make_stream() and whose timing alternates bursts of tokens
+with pauses:
+
+    python3 paper/downstream/benchmarks/cs1_traces.py synth traces/ --count 5
+"""
+
+import argparse
+import json
+import random
+import time
+from pathlib import Path
+from typing import NamedTuple
+
+from cs1_streams import StreamConfig, make_stream
+
+
+class TraceToken(NamedTuple):
+    t: float
+    token: str
+
+
+class TraceRecorder:
+    """Stamp tokens with their arrival time as a stream is consumed."""
+
+    def __init__(self) -> None:
+        self.tokens: list[TraceToken] = []
+        self._start: float | None = None
+
+    def add(self, token: str) -> None:
+        now = time.perf_counter()
+        if self._start is None:
+            self._start = now
+        self.tokens.append(TraceToken(now - self._start, token))
+
+    def save(self, path: Path, meta: dict | None = None) -> None:
+        save_trace(path, self.tokens, meta)
+
+
+def load_trace(path: Path) -> list[TraceToken]:
+    """Read a trace file.
+
+    Raises:
+        ValueError: If a line is not a token record or times decrease.
+    """
+    tokens: list[TraceToken] = []
+    last = 0.0
+    with open(path, encoding="utf-8") as f:
+        for lineno, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"{path}:{lineno}: {e}") from None
+            if not isinstance(record, dict):
+                raise ValueError(f"{path}:{lineno}: record is not a JSON object")
+            if lineno == 1 and "trace" in record:
+                continue
+            try:
+                t, token = float(record["t"]), record["token"]
+            except (KeyError, TypeError, ValueError):
+                raise ValueError(f"{path}:{lineno}: expected {{\"t\": seconds, \"token\": text}}") from None
+            if not isinstance(token, str):
+                raise ValueError(f"{path}:{lineno}: token is not a string")
+            if t < last:
+                raise ValueError(f"{path}:{lineno}: arrival time goes backwards")
+            last = t
+            tokens.append(TraceToken(t, token))
+    return tokens
+
+
+def save_trace(path: Path, tokens: list[TraceToken], meta: dict | None = None) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        if meta is not None:
+            f.write(json.dumps({"trace": meta}) + "\n")
+        for t, token in tokens:
+            f.write(json.dumps({"t": round(t, 6), "token": token}, ensure_ascii=False) + "\n")
+
+
+def synthesize_trace(
+    config: StreamConfig,
+    first_token_s: float = 0.4,
+    burst_tokens: float = 8.0,
+    token_gap_s: float = 0.004,
+    pause_s: float = 0.08,
+) -> list[TraceToken]:
+    """Bursty timing over make_stream(config).
+
+    Bursts have a geometric number of tokens (mean burst_tokens) spaced by
+    exponential gaps (mean token_gap_s); bursts are separated by lognormal
+    pauses with median pause_s.
+    """
+    rng = random.Random(config.seed)
+    t = first_token_s
+    tokens = []
+    for token in make_stream(config):
+        tokens.append(TraceToken(t, token))
+        if rng.random() < 1 / burst_tokens:
+            t += rng.lognormvariate(0, 0.75) * pause_s
+        else:
+            t += rng.expovariate(1 / token_gap_s)
+    return tokens
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CS1 token-stream traces")
+    sub = parser.add_subparsers(dest="command", required=True)
+    synth = sub.add_parser("synth", help="write synthetic bursty traces")
+    synth.add_argument("out_dir", type=Path)
+    synth.add_argument("--count", type=int, default=5)
+    synth.add_argument("--chars", type=int, default=4000)
+    synth.add_argument("--token-size", type=int, default=4)
+    synth.add_argument("--citation-density", type=float, default=0.05)
+    args = parser.parse_args()
+
+    args.out_dir.mkdir(parents=True, exist_ok=True)
+    for i in range(args.count):
+        config = StreamConfig(
+            token_size=args.token_size,
+            citation_density=args.citation_density,
+            n_chars=args.chars,
+            seed=i,
+        )
+        path = args.out_dir / f"synth-{i:03d}.jsonl"
+        tokens = synthesize_trace(config)
+        save_trace(path, tokens, {"synthetic": True, "config": config.label, "seed": i})
+        print(f"{path}: {len(tokens)} tokens over {tokens[-1].t:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
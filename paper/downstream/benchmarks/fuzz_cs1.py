@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""Differential fuzzing and performance regression harness for CS1.
+
+Generates random streams with random token split points, feeds each one to
+ReferenceCitationRenumberer and to every implementation under
+implementations/cs1/ in-process, and compares the per-token outputs and the
+source list (--oracle token). --oracle text instead compares the joined
+output with the reference applied to the unsplit text, which is what a
+split-boundary-aware implementation should produce. For each
+implementation the first divergence is reported
+together with a reproducer minimized by greedily dropping tokens, merging
+neighbouring tokens and trimming characters while the divergence persists.
+
+Time spent inside each implementation is accumulated over the same cases,
+so tokens/sec is recorded alongside correctness. With --baseline, an
+implementation that matched the reference in the baseline run but diverges
+now, or whose throughput dropped by more than --tolerance, is reported as a
+regression and the exit status is 1.
+
+Usage:
+    python3 paper/downstream/benchmarks/fuzz_cs1.py --cases 5000
+    python3 paper/downstream/benchmarks/fuzz_cs1.py --baseline paper/downstream/results/fuzz_cs1.json
+
+Output: paper/downstream/results/fuzz_cs1.json
+"""
+
+import argparse
+import json
+import random
+import sys
+import time
+from collections.abc import Callable
+from pathlib import Path
+
+from cs1_impls import REFERENCE_NAME, load_cs1_implementations
+
+RESULTS_DIR = Path(__file__).parent.parent / "results"
+
+# Building blocks of fuzzed text: valid, non-canonical and non-ASCII ids,
+# prefixes that fail late, and separators.
+PIECES = [
+    "source_1", "source_2", "source_7", "source_12", "source_007", "source_0",
+    "source_4096", "source_٣", "source_", "sour", "s", "ce_", "_3", "9",
+    " ", "\n", "text", "[1]", "引用", "sources_1", "ssource_2",
+]
+
+
+def make_case(rng: random.Random, max_pieces: int = 24, max_cuts: int = 8) -> list[str]:
+    """Random text cut at random points into tokens."""
+    text = "".join(rng.choice(PIECES) for _ in range(rng.randint(0, max_pieces)))
+    n_cuts = min(len(text) + 1, rng.randint(0, max_cuts))
+    cuts = sorted(rng.sample(range(len(text) + 1), n_cuts))
+    bounds = [0] + cuts + [len(text)]
+    return [text[a:b] for a, b in zip(bounds, bounds[1:])]
+
+
+def run_case(factory: Callable[[], object], tokens: list[str]) -> tuple:
+    """Return (per-token outputs, source list), or ("error", message)."""
+    try:
+        r = factory()
+        out = [r.process_token(t) for t in tokens]
+        return out, [tuple(entry) for entry in r.get_source_list()]
+    except Exception as e:
+        return "error", f"{type(e).__name__}: {e}"
+
+
+def observe(factory: Callable[[], object], tokens: list[str], oracle: str, is_reference: bool) -> tuple:
+    """What is compared under oracle: per-token outputs, or the joined text."""
+    if oracle == "token":
+        return run_case(factory, tokens)
+    result = run_case(factory, ["".join(tokens)] if is_reference else tokens)
+    if result[0] == "error":
+        return result
+    return "".join(result[0]), result[1]
+
+
+def minimize(factory, reference, tokens: list[str], oracle: str) -> list[str]:
+    """Shrink a case on which factory diverges from reference while it still does."""
+    tokens = list(tokens)
+    changed = True
+    while changed:
+        changed = False
+        candidates = []
+        for i in range(len(tokens)):
+            candidates.append(tokens[:i] + tokens[i + 1:])
+        for i in range(len(tokens) - 1):
+            candidates.append(tokens[:i] + [tokens[i] + tokens[i + 1]] + tokens[i + 2:])
+        for i, token in enumerate(tokens):
+            for j in range(len(token)):
+                candidates.append(tokens[:i] + [token[:j] + token[j + 1:]] + tokens[i + 1:])
+        for candidate in candidates:
+            if observe(factory, candidate, oracle, False) != observe(reference, candidate, oracle, True):
+                tokens = candidate
+                changed = True
+                break
+    return tokens
+
+
+def fuzz(
+    factories: dict[str, Callable[[], object]], n_cases: int, seed: int, oracle: str = "token"
+) -> dict[str, dict]:
+    reference = factories[REFERENCE_NAME]
+    rng = random.Random(seed)
+    clock = time.perf_counter
+    report = {name: {"seconds": 0.0, "tokens": 0, "divergences": 0, "first": None} for name in factories}
+
+    for case_no in range(n_cases):
+        tokens = make_case(rng)
+        expected = None
+        for name, factory in factories.items():
+            start = clock()
+            result = run_case(factory, tokens)
+            entry = report[name]
+            entry["seconds"] += clock() - start
+            entry["tokens"] += len(tokens)
+            if name == REFERENCE_NAME:
+                expected = result if oracle == "token" else observe(reference, tokens, oracle, True)
+                continue
+            if oracle == "text" and result[0] != "error":
+                result = "".join(result[0]), result[1]
+            if result != expected:
+                entry["divergences"] += 1
+                if entry["first"] is None:
+                    entry["first"] = {"case": case_no, "tokens": tokens}
+
+    for name, entry in report.items():
+        entry["tokens_per_sec"] = entry["tokens"] / entry["seconds"] if entry["seconds"] else 0.0
+        first = entry["first"]
+        if first is not None:
+            small = minimize(factories[name], reference, first["tokens"], oracle)
+            first["minimized"] = small
+            first["expected"] = observe(reference, small, oracle, True)
+            first["got"] = observe(factories[name], small, oracle, False)
+    return report
+
+
+def find_regressions(report: dict[str, dict], baseline: dict[str, dict], tolerance: float) -> list[str]:
+    problems = []
+    for name, entry in report.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        if base["divergences"] == 0 and entry["divergences"]:
+            problems.append(f"{name}: now diverges from the reference")
+        if base["tokens_per_sec"] and entry["tokens_per_sec"] < (1 - tolerance) * base["tokens_per_sec"]:
+            drop = 1 - entry["tokens_per_sec"] / base["tokens_per_sec"]
+            problems.append(f"{name}: throughput down {drop:.0%}")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--cases", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--oracle", choices=["token", "text"], default="token")
+    parser.add_argument("--baseline", type=Path, default=None)
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="allowed fractional throughput drop against the baseline")
+    parser.add_argument("--output", type=Path, default=RESULTS_DIR / "fuzz_cs1.json")
+    args = parser.parse_args()
+
+    factories = load_cs1_implementations()
+    start = time.perf_counter()
+    report = fuzz(factories, args.cases, args.seed, args.oracle)
+    elapsed = time.perf_counter() - start
+    print(f"{args.cases} cases x {len(factories)} implementations ({args.oracle} oracle) in {elapsed:.2f}s "
+          f"({args.cases / elapsed:,.0f} cases/sec, including minimization)\n")
+
+    print(f"{'Implementation':<26} {'Tokens/sec':>12} {'Diverging':>10}")
+    for name, entry in report.items():
+        print(f"{name:<26} {entry['tokens_per_sec']:>12,.0f} {entry['divergences']:>10}")
+    for name, entry in report.items():
+        first = entry["first"]
+        if first is not None:
+            print(f"\n{name}: first divergence at case {first['case']}")
+            print(f"  reproducer: {first['minimized']!r}")
+            print(f"  expected:   {first['expected']!r}")
+            print(f"  got:        {first['got']!r}")
+
+    status = 0
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+        problems = find_regressions(report, baseline, args.tolerance)
+        print("\nRegressions against baseline:" if problems else "\nNo regressions against baseline.")
+        for problem in problems:
+            print(f"  {problem}")
+        status = 1 if problems else 0
+
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump({"cases": args.cases, "seed": args.seed, "oracle": args.oracle, "results": report}, f, indent=2)
+    print(f"\nResults saved to {args.output}")
+    sys.exit(status)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""Load test for the process-pool CS1 service (runtime/cs1_service.py).
+
+Starts RenumberingService with 1..N workers and drives it with concurrent
+pipelined clients, each interleaving several streams built with
+cs1_streams.make_stream. Records aggregate tokens/sec per worker count, so
+scaling across cores can be read directly from the output.
+
+Usage:
+    python3 paper/downstream/benchmarks/loadtest_cs1_service.py
+    python3 paper/downstream/benchmarks/loadtest_cs1_service.py --workers 1 2 4 --clients 16
+
+Output: paper/downstream/results/loadtest_cs1_service.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from cs1_streams import StreamConfig, make_stream
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from runtime.cs1_service import SOURCES, RenumberingService, ServiceClient
+
+RESULTS_DIR = Path(__file__).parent.parent / "results"
+
+
+async def run_client(path: str, client_id: int, streams: list[list[str]]) -> int:
+    """Send every stream interleaved token by token; return tokens answered."""
+    client = await ServiceClient.connect(path)
+    ids = [f"c{client_id}-s{i}" for i in range(len(streams))]
+    expected = sum(len(tokens) for tokens in streams) + len(streams)
+
+    async def send():
+        for step in range(max(len(tokens) for tokens in streams)):
+            for stream_id, tokens in zip(ids, streams):
+                if step < len(tokens):
+                    client.send_token(stream_id, tokens[step])
+            await client.drain()
+        for stream_id in ids:
+            client.close_stream(stream_id)
+        await client.drain()
+
+    async def receive():
+        closed = 0
+        for _ in range(expected):
+            kind, _, _ = await client.receive()
+            closed += kind == SOURCES
+        assert closed == len(streams)
+
+    await asyncio.gather(send(), receive())
+    await client.close()
+    return expected - len(streams)
+
+
+async def measure(n_workers: int, n_clients: int, streams: list[list[str]]) -> float:
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "cs1.sock")
+        service = RenumberingService(path, n_workers)
+        await service.start()
+        try:
+            start = time.perf_counter()
+            counts = await asyncio.gather(*(run_client(path, c, streams) for c in range(n_clients)))
+            elapsed = time.perf_counter() - start
+        finally:
+            await service.close()
+    return sum(counts) / elapsed
+
+
+def main():
+    cores = os.cpu_count() or 1
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--workers", type=int, nargs="+", default=list(range(1, cores + 1)))
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--streams-per-client", type=int, default=8)
+    parser.add_argument("--token-size", type=int, default=4)
+    parser.add_argument("--chars", type=int, default=4_000)
+    parser.add_argument("--output", type=Path, default=RESULTS_DIR / "loadtest_cs1_service.json")
+    args = parser.parse_args()
+
+    streams = [
+        make_stream(StreamConfig(token_size=args.token_size, n_chars=args.chars, seed=seed))
+        for seed in range(args.streams_per_client)
+    ]
+    total = args.clients * sum(len(tokens) for tokens in streams)
+    print(f"{args.clients} clients x {args.streams_per_client} streams, {total} tokens per run")
+    print(f"{'Workers':>7} {'Tokens/sec':>12} {'Speedup':>8}")
+
+    results = []
+    for n_workers in args.workers:
+        tps = asyncio.run(measure(n_workers, args.clients, streams))
+        base = results[0]["tokens_per_sec"] if results else tps
+        print(f"{n_workers:>7} {tps:>12,.0f} {tps / base:>7.2f}x")
+        results.append({"workers": n_workers, "tokens_per_sec": tps})
+
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump({
+            "cpu_count": cores,
+            "clients": args.clients,
+            "streams_per_client": args.streams_per_client,
+            "token_size": args.token_size,
+            "chars": args.chars,
+            "results": results,
+        }, f, indent=2)
+    print(f"\nResults saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
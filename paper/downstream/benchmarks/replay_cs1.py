@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""Replay recorded token streams through every CS1 implementation.
+
+Feeds each trace (see cs1_traces.py) to ReferenceCitationRenumberer and to
+every implementation under implementations/cs1/ in one invocation. By
+default tokens are released at their recorded arrival times (scaled by
+--speed); --flat releases them back to back. Implementations are fed
+round-robin from the same replay loop, and each one is timed on its own
+clock: token k becomes available at max(recorded arrival, end of the
+previous call) and is displayed when its process_token() call returns, so
+no implementation is charged for the others' work or for sleep jitter. A
+flush() method, when present, runs after the last token.
+
+Per implementation, over all traces:
+
+  - tokens_per_sec : tokens / time spent inside the implementation
+  - ttfc_ms        : time from stream start until the first citation is
+                     fully displayed (median over traces), and hold_ms, how
+                     much of that is spent after its last digit arrived
+  - held_p50/p99_ms: per output character, time from the arrival of the
+                     input character that determines it (the last digit
+                     for a citation) until it is displayed
+  - held_pct       : share of characters displayed after a later token
+                     arrived than the one that completed them
+
+Latencies are measured against the whole-text rendering; an implementation
+whose joined output differs is measured up to the first difference
+(measured_pct is the share of characters covered) and its trace is not
+counted under "match".
+
+Usage:
+    python3 paper/downstream/benchmarks/cs1_traces.py synth traces/
+    python3 paper/downstream/benchmarks/replay_cs1.py traces/
+    python3 paper/downstream/benchmarks/replay_cs1.py traces/ --flat --runtime
+
+Output: paper/downstream/results/replay_cs1.json
+"""
+
+import argparse
+import json
+import re
+import statistics
+import sys
+import time
+from bisect import bisect_right
+from collections.abc import Callable
+from itertools import accumulate
+from pathlib import Path
+from typing import NamedTuple
+
+BASE_DIR = Path(__file__).parent.parent
+RESULTS_DIR = BASE_DIR / "results"
+sys.path.insert(0, str(BASE_DIR))
+
+from runtime.cs1_stream import StreamingRenumberer
+
+from bench_cs1 import percentile
+from cs1_impls import load_cs1_implementations
+from cs1_traces import TraceToken, load_trace
+
+CITATION_RE = re.compile(r"source_\d+")
+
+
+class Rendering(NamedTuple):
+    text: str
+    origin: list[int]  # per output char: input index of the char that completes it
+    first_citation: int | None  # output index of the last char of the first citation
+
+
+def render(text: str) -> Rendering:
+    """Whole-text CS1 rendering with the input position behind every output char."""
+    parts: list[str] = []
+    origin: list[int] = []
+    numbers: dict[str, int] = {}
+    first = None
+    pos = 0
+    for m in CITATION_RE.finditer(text):
+        parts.append(text[pos:m.start()])
+        origin.extend(range(pos, m.start()))
+        num = numbers.setdefault(m.group(), len(numbers) + 1)
+        label = f"[{num}]"
+        parts.append(label)
+        origin.extend([m.end() - 1] * len(label))
+        if first is None:
+            first = len(origin) - 1
+        pos = m.end()
+    parts.append(text[pos:])
+    origin.extend(range(pos, len(text)))
+    return Rendering("".join(parts), origin, first)
+
+
+class _Feed:
+    """One implementation's replay of one trace."""
+
+    def __init__(self, renumberer) -> None:
+        self.r = renumberer
+        self.costs: list[float] = []
+        self.outputs: list[str] = []
+        self.error: str | None = None
+
+    def call(self, fn: Callable, *args) -> None:
+        if self.error is not None:
+            return
+        clock = time.perf_counter
+        try:
+            start = clock()
+            out = fn(*args)
+            self.costs.append(clock() - start)
+        except Exception as e:
+            self.error = f"{type(e).__name__}: {e}"
+            return
+        self.outputs.append(out if isinstance(out, str) else "")
+
+
+def replay(
+    trace: list[TraceToken], factories: dict[str, Callable[[], object]], speed: float | None
+) -> dict[str, _Feed]:
+    """Feed trace to one instance per factory; speed=None replays flat out."""
+    feeds = {name: _Feed(factory()) for name, factory in factories.items()}
+    order = list(feeds.values())
+    clock = time.perf_counter
+    start = clock()
+    for t, token in trace:
+        if speed is not None:
+            delay = start + t / speed - clock()
+            if delay > 0:
+                time.sleep(delay)
+        order.append(order.pop(0))
+        for feed in order:
+            feed.call(feed.r.process_token, token)
+    for feed in order:
+        flush = getattr(feed.r, "flush", None)
+        if callable(flush):
+            feed.call(flush)
+    return feeds
+
+
+def measure(trace: list[TraceToken], feed: _Feed, expected: Rendering, speed: float | None) -> dict:
+    """Timing metrics of one replayed trace, on the implementation's own clock."""
+    n_tokens = len(trace)
+    # available[k] / done[k]: when call k could start and when it returned.
+    available, done = [], []
+    prev = 0.0
+    for k, cost in enumerate(feed.costs):
+        at = trace[min(k, n_tokens - 1)].t / speed if speed is not None else 0.0
+        begin = max(at, prev)
+        available.append(begin)
+        prev = begin + cost
+        done.append(prev)
+
+    in_end = list(accumulate(len(token) for _, token in trace))
+    out_end = list(accumulate(len(out) for out in feed.outputs))
+    joined = "".join(feed.outputs)
+    common = 0
+    limit = min(len(joined), len(expected.text))
+    while common < limit and joined[common] == expected.text[common]:
+        common += 1
+
+    latencies = []
+    held = 0
+    for p in range(common):
+        k = bisect_right(in_end, expected.origin[p])
+        j = bisect_right(out_end, p)
+        latencies.append(done[j] - available[k])
+        held += j > k
+
+    ttfc = hold = None
+    first = expected.first_citation
+    if first is not None and first < common:
+        j = bisect_right(out_end, first)
+        k = bisect_right(in_end, expected.origin[first])
+        ttfc = done[j]
+        hold = done[j] - available[k]
+    return {
+        "seconds": sum(feed.costs),
+        "latencies": latencies,
+        "held": held,
+        "chars": common,
+        "expected_chars": len(expected.text),
+        "ttfc": ttfc,
+        "hold": hold,
+        "match": joined == expected.text,
+    }
+
+
+def run(traces: dict[str, list[TraceToken]], factories: dict[str, Callable[[], object]], speed: float | None) -> dict:
+    totals = {
+        name: {"tokens": 0, "seconds": 0.0, "latencies": [], "held": 0, "chars": 0,
+               "expected_chars": 0, "ttfc": [], "hold": [], "matched": 0, "errors": {}}
+        for name in factories
+    }
+    for trace_name, trace in traces.items():
+        expected = render("".join(token for _, token in trace))
+        for name, feed in replay(trace, factories, speed).items():
+            total = totals[name]
+            if feed.error is not None:
+                total["errors"][trace_name] = feed.error
+                continue
+            m = measure(trace, feed, expected, speed)
+            total["tokens"] += len(trace)
+            total["seconds"] += m["seconds"]
+            total["latencies"].extend(m["latencies"])
+            total["held"] += m["held"]
+            total["chars"] += m["chars"]
+            total["expected_chars"] += m["expected_chars"]
+            total["matched"] += m["match"]
+            if m["ttfc"] is not None:
+                total["ttfc"].append(m["ttfc"])
+                total["hold"].append(m["hold"])
+
+    report = {}
+    for name, total in totals.items():
+        latencies = sorted(total["latencies"])
+        report[name] = {
+            "tokens_per_sec": total["tokens"] / total["seconds"] if total["seconds"] else 0.0,
+            "ttfc_ms": statistics.median(total["ttfc"]) * 1e3 if total["ttfc"] else None,
+            "hold_ms": statistics.median(total["hold"]) * 1e3 if total["hold"] else None,
+            "held_p50_ms": percentile(latencies, 0.50) * 1e3,
+            "held_p99_ms": percentile(latencies, 0.99) * 1e3,
+            "held_pct": 100 * total["held"] / total["chars"] if total["chars"] else 0.0,
+            "measured_pct": 100 * total["chars"] / total["expected_chars"] if total["expected_chars"] else 0.0,
+            "matched": total["matched"],
+            "errors": total["errors"],
+        }
+    return report
+
+
+def _ms(value: float | None) -> str:
+    return f"{value:.3f}" if value is not None else "-"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("traces", type=Path, nargs="+", help="trace files or directories of *.jsonl traces")
+    parser.add_argument("--speed", type=float, default=1.0, help="replay speed relative to the recording")
+    parser.add_argument("--flat", action="store_true", help="ignore recorded timing and replay flat out")
+    parser.add_argument("--runtime", action="store_true", help="also replay runtime StreamingRenumberer")
+    parser.add_argument("--output", type=Path, default=RESULTS_DIR / "replay_cs1.json")
+    args = parser.parse_args()
+    if args.speed <= 0:
+        parser.error("--speed must be positive")
+
+    paths = []
+    for path in args.traces:
+        paths.extend(sorted(path.glob("*.jsonl")) if path.is_dir() else [path])
+    traces = {str(path): load_trace(path) for path in paths}
+    traces = {name: trace for name, trace in traces.items() if trace}
+    if not traces:
+        parser.error("no non-empty traces found")
+
+    factories = load_cs1_implementations()
+    if args.runtime:
+        factories["runtime-streaming"] = StreamingRenumberer
+    speed = None if args.flat else args.speed
+    n_tokens = sum(len(trace) for trace in traces.values())
+    mode = "flat out" if speed is None else f"at {speed:g}x recorded speed"
+    print(f"Replaying {len(traces)} traces ({n_tokens} tokens) {mode} through {len(factories)} implementations\n")
+
+    report = run(traces, factories, speed)
+    print(f"{'Implementation':<26} {'Tokens/sec':>12} {'TTFC ms':>9} {'Hold ms':>9} "
+          f"{'p50 ms':>8} {'p99 ms':>8} {'Held %':>7} {'Measured %':>10} {'Match':>7}")
+    for name, entry in report.items():
+        print(f"{name:<26} {entry['tokens_per_sec']:>12,.0f} {_ms(entry['ttfc_ms']):>9} {_ms(entry['hold_ms']):>9} "
+              f"{entry['held_p50_ms']:>8.3f} {entry['held_p99_ms']:>8.3f} {entry['held_pct']:>7.2f} "
+              f"{entry['measured_pct']:>10.1f} "
+              f"{entry['matched']:>3}/{len(traces):<3}")
+        for trace_name, error in entry["errors"].items():
+            print(f"  {trace_name}: {error}")
+
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump({"traces": list(traces), "speed": speed, "results": report}, f, indent=2)
+    print(f"\nResults saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""Integer-keyed allocation fast path for source_N identifiers.
+
+The CS1 implementations key their maps by the full "source_N" string and
+format f"[{k}]" for every hit: one string hash, one dict probe and one new
+string per citation. Retrieval top-k bounds N, so IntAllocator parses N to
+an int and keeps display numbers in a dense list indexed by N, falling back
+to a dict keyed by the id string for large N and for non-canonical spellings
+such as source_007 (which the reference treats as distinct from source_7).
+label(k) returns interned "[k]" strings shared by every stream.
+
+FastCitationRenumberer produces output identical to
+ReferenceCitationRenumberer. Its process_tokens() renumbers a batch of
+tokens with one regex pass over the batch joined by a separator: no
+citation can span the separator, so per-token results and numbering are
+exactly those of calling process_token() on each token in turn.
+
+bind_sink() returns a per-token function that writes the renumbered token
+into a caller-supplied sink (an object with write(), or a writer callable)
+piece by piece, so no per-token result string is built. There is no
+bytearray sink: rendering into UTF-8 directly measured slower than
+encoding process_token() output (benchmarks/bench_cs1_sink.py).
+"""
+
+import re
+from collections.abc import Callable
+
+_SOURCE_RE = re.compile(r"source_(\d+)")
+
+# Joins batched tokens; any non-digit ends a source_N match.
+_BATCH_SEP = "\x00"
+
+# N below this is looked up in the dense list; the list grows on demand.
+DENSE_LIMIT = 4096
+
+# Display numbers below this get an interned label.
+_LABEL_CACHE_SIZE = 4096
+_LABELS: list[str] = [f"[{k}]" for k in range(64)]
+
+
+def label(k: int) -> str:
+    """Return the display label "[k]", shared for small k."""
+    if k < len(_LABELS):
+        return _LABELS[k]
+    if k < _LABEL_CACHE_SIZE:
+        _LABELS.extend(f"[{i}]" for i in range(len(_LABELS), k + 1))
+        return _LABELS[k]
+    return f"[{k}]"
+
+
+class IntAllocator:
+    """First-appearance display numbers keyed by the parsed N of source_N."""
+
+    __slots__ = ("_dense", "_sparse", "_ids")
+
+    def __init__(self) -> None:
+        self._dense: list[int] = []  # N -> display number, 0 if unassigned
+        self._sparse: dict[str, int] = {}  # digits -> display number
+        self._ids: list[str] = []  # display order; k = index + 1
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def allocate(self, digits: str) -> int:
+        """Return the display number for source_<digits>, allocating on first use."""
+        if len(digits) < 5 and digits.isascii() and (digits[0] != "0" or len(digits) == 1):
+            n = int(digits)
+            if n < DENSE_LIMIT:
+                dense = self._dense
+                if n < len(dense):
+                    k = dense[n]
+                    if k:
+                        return k
+                else:
+                    dense.extend([0] * (n + 1 - len(dense)))
+                self._ids.append("source_" + digits)
+                k = dense[n] = len(self._ids)
+                return k
+
+        k = self._sparse.get(digits)
+        if k is None:
+            self._ids.append("source_" + digits)
+            k = self._sparse[digits] = len(self._ids)
+        return k
+
+    def source_list(self, start: int = 0) -> list[tuple[int, str]]:
+        """Return [(k, source_id), ...] for display numbers after start."""
+        return list(enumerate(self._ids[start:], start + 1))
+
+
+class FastCitationRenumberer:
+    """
+    Per-token renumbering on the integer allocation fast path.
+
+    Implements the required interface: process_token / get_source_list.
+    """
+
+    def __init__(self) -> None:
+        self._alloc = IntAllocator()
+
+    def process_token(self, token: str) -> str:
+        """Process one streaming token; return it with source_N renumbered."""
+        if "source_" not in token:
+            return token
+        allocate = self._alloc.allocate
+        parts: list[str] = []
+        pos = 0
+        for match in _SOURCE_RE.finditer(token):
+            start = match.start()
+            if start > pos:
+                parts.append(token[pos:start])
+            parts.append(label(allocate(match.group(1))))
+            pos = match.end()
+        if pos < len(token):
+            parts.append(token[pos:])
+        # A token that is exactly one citation returns the interned label.
+        return "".join(parts)
+
+    def process_tokens(self, tokens: list[str]) -> list[str]:
+        """Process a batch of tokens; return the per-token outputs."""
+        joined = _BATCH_SEP.join(tokens)
+        if "source_" not in joined:
+            return list(tokens)
+        if joined.count(_BATCH_SEP) != len(tokens) - 1:
+            # A token contains the separator; splitting would be ambiguous.
+            return [self.process_token(token) for token in tokens]
+        allocate = self._alloc.allocate
+        return _SOURCE_RE.sub(lambda m: label(allocate(m.group(1))), joined).split(_BATCH_SEP)
+
+    def bind_sink(self, sink: object) -> Callable[[str], None]:
+        """Return a function that renumbers one token into sink.
+
+        Args:
+            sink: An object with a write(str) method such as io.StringIO, or
+                a callable taking str.
+
+        Returns:
+            A function of one token, equivalent to writing
+            process_token(token) into sink.
+        """
+        allocate = self._alloc.allocate
+        write = getattr(sink, "write", sink)
+        if not callable(write):
+            raise TypeError(f"unsupported sink: {type(sink).__name__}")
+        finditer = _SOURCE_RE.finditer
+
+        def feed(token: str) -> None:
+            if "source_" not in token:
+                write(token)
+                return
+            pos = 0
+            for match in finditer(token):
+                start = match.start()
+                if start > pos:
+                    write(token[pos:start])
+                write(label(allocate(match.group(1))))
+                pos = match.end()
+            if pos < len(token):
+                write(token[pos:])
+
+        return feed
+
+    def get_source_list(self) -> list[tuple[int, str]]:
+        return self._alloc.source_list()
@@ -0,0 +1,130 @@
+"""ASGI middleware renumbering citations in streaming responses.
+
+CitationRenumberMiddleware wraps an ASGI app and renumbers source_N
+citations in the http.response.body chunks of text responses (by default
+text/event-stream and text/plain) as they pass through:
+
+    app = CitationRenumberMiddleware(chat_app)
+
+Each response gets a ByteStreamingRenumberer taken from a pool shared by
+the middleware and returned to it, reset, when the response ends. Chunks
+are renumbered as raw UTF-8 bytes and forwarded at once; only a possible
+citation prefix at the end of a chunk ("... sour") is held back until the
+next chunk, so the response is never buffered. When the app sends the last
+body chunk, the held-back text is flushed and the trailer, by default an
+SSE "sources" event for event streams, is appended with the final source
+list:
+
+    event: sources
+    data: [[1, "source_7"], [2, "source_2"]]
+
+Content-Length is dropped from renumbered responses because rewriting
+changes the length; responses with a Content-Encoding pass through as is.
+"""
+
+import json
+import sys
+from collections.abc import Awaitable, Callable, Container, MutableMapping
+from typing import Any
+
+sys.path.insert(0, __file__.rsplit("/", 2)[0])
+from runtime.cs1_stream import ByteStreamingRenumberer
+
+Scope = MutableMapping[str, Any]
+Message = MutableMapping[str, Any]
+Receive = Callable[[], Awaitable[Message]]
+Send = Callable[[Message], Awaitable[None]]
+ASGIApp = Callable[[Scope, Receive, Send], Awaitable[None]]
+Trailer = Callable[[bytes, list[tuple[int, str]]], bytes]
+
+
+def sse_sources_trailer(content_type: bytes, sources: list[tuple[int, str]]) -> bytes:
+    """Default trailer: an SSE "sources" event, for event streams only."""
+    if not content_type.startswith(b"text/event-stream"):
+        return b""
+    return b"event: sources\ndata: " + json.dumps(sources).encode() + b"\n\n"
+
+
+class CitationRenumberMiddleware:
+    """Renumbers citations in streamed text responses of an ASGI app."""
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        content_types: tuple[bytes, ...] = (b"text/event-stream", b"text/plain"),
+        source_catalog: Container[str] | None = None,
+        trailer: Trailer = sse_sources_trailer,
+        max_pooled: int = 1024,
+    ) -> None:
+        """
+        Args:
+            app: The wrapped ASGI application.
+            content_types: Media types whose bodies are renumbered.
+            source_catalog: Known source ids; others render as "[?]".
+            trailer: Builds the bytes appended after the last chunk from the
+                     response content type and the final source list.
+            max_pooled: Idle renumberers kept for reuse.
+        """
+        self.app = app
+        self._content_types = content_types
+        self._catalog = source_catalog
+        self._trailer = trailer
+        self._max_pooled = max_pooled
+        self._pool: list[ByteStreamingRenumberer] = []
+
+    def _acquire(self) -> ByteStreamingRenumberer:
+        if self._pool:
+            return self._pool.pop()
+        return ByteStreamingRenumberer(source_catalog=self._catalog)
+
+    def _release(self, renumberer: ByteStreamingRenumberer) -> None:
+        if len(self._pool) < self._max_pooled:
+            renumberer.reset()
+            self._pool.append(renumberer)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        renumberer: ByteStreamingRenumberer | None = None
+        content_type = b""
+
+        async def send_renumbered(message: Message) -> None:
+            nonlocal renumberer, content_type
+            if message["type"] == "http.response.start":
+                headers = message.get("headers", [])
+                for name, value in headers:
+                    name = name.lower()
+                    if name == b"content-type":
+                        content_type = value.lower()
+                    elif name == b"content-encoding":
+                        content_type = b""
+                        break
+                if content_type.startswith(self._content_types):
+                    renumberer = self._acquire()
+                    message = dict(message)
+                    message["headers"] = [(n, v) for n, v in headers if n.lower() != b"content-length"]
+                await send(message)
+                return
+            if message["type"] != "http.response.body" or renumberer is None:
+                await send(message)
+                return
+
+            more_body = message.get("more_body", False)
+            body = renumberer.process_chunk(message.get("body", b""))
+            if not more_body:
+                body += renumberer.flush()
+                body += self._trailer(content_type, renumberer.get_source_list())
+                self._release(renumberer)
+                renumberer = None
+            elif not body:
+                return  # the whole chunk is held back
+            await send({"type": "http.response.body", "body": body, "more_body": more_body})
+
+        try:
+            await self.app(scope, receive, send_renumbered)
+        finally:
+            # A response that ended early never sent its last chunk.
+            if renumberer is not None:
+                self._release(renumberer)
@@ -0,0 +1,206 @@
+"""Asyncio streaming adapter for CS1 citation renumbering.
+
+Wraps an AsyncIterable[str] of LLM tokens and yields renumbered chunks:
+
+    stream = AsyncCitationStream(llm_tokens())
+    async for chunk in stream:
+        await send(chunk)
+    sources = stream.source_list
+
+The adapter is a plain async generator driven by its consumer. A token is
+only pulled from upstream when the consumer asks for the next chunk, so a
+slow consumer applies backpressure all the way to the token source, and no
+task or queue is created per token.
+
+With display_deadline set, a held-back citation prefix ("... s", "sour")
+is not left on screen indefinitely when the model stalls: if no token
+arrives within the deadline, the prefix is released as literal text (see
+StreamingRenumberer.release_pending for when that is safe). Only upstream
+reads made while text is held back run as a task awaited with a timeout.
+DisplayMetrics records how long held-back text waited before it was
+displayed, to tune the deadline.
+
+With a MetadataPrefetcher (runtime/cs1_metadata.py), the metadata lookup
+of each source starts as soon as its number is allocated, and
+enriched_source_list is available when iteration completes.
+"""
+
+import asyncio
+import sys
+import time
+from collections.abc import AsyncIterable, AsyncIterator
+from dataclasses import dataclass, field
+
+sys.path.insert(0, __file__.rsplit("/", 2)[0])
+from runtime.cs1_metadata import EnrichedSource, MetadataPrefetcher
+from runtime.cs1_stream import StreamingRenumberer
+
+
+@dataclass
+class DisplayMetrics:
+    """Time-to-display of held-back text for one stream, in seconds."""
+
+    # One entry per period during which some text was held back.
+    hold_times: list[float] = field(default_factory=list)
+    deadline_flushes: int = 0
+    released_chars: int = 0
+
+    @property
+    def max_hold(self) -> float:
+        return max(self.hold_times, default=0.0)
+
+    def percentile(self, q: float) -> float:
+        """Nearest-rank percentile of hold_times."""
+        if not self.hold_times:
+            return 0.0
+        ordered = sorted(self.hold_times)
+        return ordered[min(len(ordered) - 1, max(0, round(q * len(ordered)) - 1))]
+
+
+class AsyncCitationStream:
+    """Async iterator of renumbered chunks over an async token source."""
+
+    def __init__(
+        self,
+        tokens: AsyncIterable[str],
+        renumberer: StreamingRenumberer | None = None,
+        display_deadline: float | None = None,
+        prefetcher: MetadataPrefetcher | None = None,
+    ) -> None:
+        """
+        Args:
+            tokens: Async iterable of raw LLM tokens.
+            renumberer: Renumberer holding the stream's parser and registry.
+                        A fresh StreamingRenumberer is used when omitted.
+            display_deadline: Seconds a held-back prefix may wait for the next
+                        token before it is released as literal text. None
+                        holds it until the next token or the end of stream.
+            prefetcher: Shared metadata prefetcher; lookups start as numbers
+                        are allocated.
+        """
+        self._tokens = tokens
+        self._renumberer = renumberer if renumberer is not None else StreamingRenumberer()
+        self._deadline = display_deadline
+        self._source_list: list[tuple[int, str]] | None = None
+        self._metrics = DisplayMetrics()
+        self._held_since: float | None = None
+        self._prefetcher = prefetcher
+        self._lookups: list[asyncio.Future] = []
+        self._enriched: list[EnrichedSource] | None = None
+
+    @property
+    def renumberer(self) -> StreamingRenumberer:
+        return self._renumberer
+
+    @property
+    def source_list(self) -> list[tuple[int, str]]:
+        """Final source list; available once iteration has completed."""
+        if self._source_list is None:
+            raise RuntimeError("source list is not final until the stream ends")
+        return self._source_list
+
+    @property
+    def enriched_source_list(self) -> list[EnrichedSource]:
+        """Source list with metadata; available once iteration has completed
+        with a prefetcher."""
+        if self._enriched is None:
+            raise RuntimeError("enriched source list needs a prefetcher and a finished stream")
+        return self._enriched
+
+    @property
+    def metrics(self) -> DisplayMetrics:
+        """Time-to-display metrics of held-back text."""
+        return self._metrics
+
+    def __aiter__(self) -> AsyncIterator[str]:
+        if self._deadline is None:
+            return self._run()
+        return self._run_with_deadline()
+
+    async def _run(self) -> AsyncIterator[str]:
+        renumberer = self._renumberer
+        async for token in self._tokens:
+            chunk = renumberer.process_token(token)
+            self._track_hold()
+            if self._prefetcher is not None:
+                self._prefetch_new()
+            # A token may be held back entirely as a possible citation prefix.
+            if chunk:
+                yield chunk
+
+        async for chunk in self._finish():
+            yield chunk
+
+    async def _run_with_deadline(self) -> AsyncIterator[str]:
+        renumberer = self._renumberer
+        metrics = self._metrics
+        tokens = aiter(self._tokens)
+        while True:
+            try:
+                if not renumberer.held_back:
+                    token = await anext(tokens)
+                else:
+                    next_token = asyncio.ensure_future(anext(tokens))
+                    try:
+                        done, _ = await asyncio.wait((next_token,), timeout=self._deadline)
+                        released = "" if done else renumberer.release_pending()
+                        if released:
+                            metrics.deadline_flushes += 1
+                            metrics.released_chars += len(released)
+                            self._track_hold()
+                            yield released
+                        token = await next_token
+                    finally:
+                        # Only still pending if the consumer closed the stream.
+                        next_token.cancel()
+            except StopAsyncIteration:
+                break
+            chunk = renumberer.process_token(token)
+            self._track_hold()
+            if self._prefetcher is not None:
+                self._prefetch_new()
+            if chunk:
+                yield chunk
+
+        async for chunk in self._finish():
+            yield chunk
+
+    async def _finish(self) -> AsyncIterator[str]:
+        renumberer = self._renumberer
+        tail = renumberer.flush()
+        self._track_hold()
+        self._source_list = renumberer.get_source_list()
+        if self._prefetcher is None:
+            if tail:
+                yield tail
+            return
+        self._prefetch_new()
+        if tail:
+            yield tail
+        metadata = await asyncio.gather(*self._lookups)
+        self._enriched = [
+            EnrichedSource(num, sid, meta) for (num, sid), meta in zip(self._source_list, metadata)
+        ]
+
+    def _prefetch_new(self) -> None:
+        lookups = self._lookups
+        for _, source_id in self._renumberer.get_source_list_since(len(lookups)):
+            lookups.append(self._prefetcher.request(source_id))
+
+    def _track_hold(self) -> None:
+        held = bool(self._renumberer.held_back)
+        if held and self._held_since is None:
+            self._held_since = time.perf_counter()
+        elif not held and self._held_since is not None:
+            self._metrics.hold_times.append(time.perf_counter() - self._held_since)
+            self._held_since = None
+
+
+async def renumber_stream(
+    tokens: AsyncIterable[str],
+    renumberer: StreamingRenumberer | None = None,
+    display_deadline: float | None = None,
+) -> AsyncIterator[str]:
+    """Yield renumbered chunks for tokens; see AsyncCitationStream."""
+    async for chunk in AsyncCitationStream(tokens, renumberer, display_deadline):
+        yield chunk
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""Offline bulk renumbering of JSONL answer corpora.
+
+Each input line is a JSON object whose text field holds a raw answer with
+source_N citations. Every record is renumbered as one complete answer with
+the CS1 semantics (first appearance, per record), and written with the
+renumbered text and its source list:
+
+    {"id": 7, "text": "see source_4 and source_2"}
+    -> {"id": 7, "text": "see [1] and [2]", "sources": [[1, "source_4"], [2, "source_2"]]}
+
+The input is memory-mapped and split into chunks of about chunk_bytes that
+end on record boundaries. Worker processes map the file themselves and
+receive only (start, end) offsets, so record data is never pickled on the
+way in. Rendered chunks are written in input order as they complete, with
+at most two chunks per worker in flight, so memory stays bounded however
+large the file is. Records without "source_" skip the renumberer.
+
+Usage:
+    python3 paper/downstream/runtime/cs1_bulk.py answers.jsonl rendered.jsonl --workers 8
+"""
+
+import argparse
+import json
+import mmap
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+
+sys.path.insert(0, __file__.rsplit("/", 2)[0])
+from runtime.cs1_alloc import FastCitationRenumberer
+
+DEFAULT_CHUNK_BYTES = 8 * 1024 * 1024
+
+
+@dataclass
+class BulkStats:
+    """Summary of one renumber_jsonl run."""
+
+    records: int
+    bytes_in: int
+    bytes_out: int
+    seconds: float
+
+
+def record_chunks(data: mmap.mmap | bytes, chunk_bytes: int) -> list[tuple[int, int]]:
+    """Split data into [start, end) ranges of about chunk_bytes that end after a newline.
+
+    Raises:
+        ValueError: If chunk_bytes is less than 1.
+    """
+    if chunk_bytes < 1:
+        raise ValueError(f"chunk_bytes must be at least 1, got {chunk_bytes}")
+    chunks = []
+    size = len(data)
+    start = 0
+    while start < size:
+        cut = data.find(b"\n", min(start + chunk_bytes, size) - 1)
+        end = size if cut < 0 else cut + 1
+        chunks.append((start, end))
+        start = end
+    return chunks
+
+
+def renumber_record(line: bytes, field: str, sources_field: str) -> bytes:
+    """Renumber one JSONL record; blank lines pass through."""
+    if not line.strip():
+        return line + b"\n"
+    record = json.loads(line)
+    if not isinstance(record, dict):
+        raise ValueError("record is not a JSON object")
+    text = record.get(field)
+    if isinstance(text, str) and "source_" in text:
+        r = FastCitationRenumberer()
+        record[field] = r.process_token(text)
+        record[sources_field] = r.get_source_list()
+    else:
+        record[sources_field] = []
+    return json.dumps(record, ensure_ascii=False).encode() + b"\n"
+
+
+def _renumber_chunk(path: str, start: int, end: int, field: str, sources_field: str) -> tuple[bytes, int]:
+    out = []
+    records = 0
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        pos = start
+        while pos < end:
+            nl = data.find(b"\n", pos, end)
+            stop = end if nl < 0 else nl
+            try:
+                out.append(renumber_record(data[pos:stop], field, sources_field))
+            except ValueError as e:
+                raise ValueError(f"invalid JSON record at byte {pos} of {path}: {e}") from None
+            records += 1
+            pos = stop + 1
+    return b"".join(out), records
+
+
+def renumber_jsonl(
+    input_path: str,
+    output_path: str,
+    field: str = "text",
+    sources_field: str = "sources",
+    workers: int | None = None,
+    chunk_bytes: int = DEFAULT_CHUNK_BYTES,
+) -> BulkStats:
+    """Renumber every record of input_path into output_path.
+
+    Args:
+        input_path: JSONL file of raw answers.
+        output_path: Destination; written sequentially in input order.
+        field: Record key holding the answer text.
+        sources_field: Record key the source list is written to.
+        workers: Worker processes; os.cpu_count() by default.
+        chunk_bytes: Approximate input bytes per work item.
+
+    Raises:
+        ValueError: If a record is not valid JSON, or chunk_bytes is less than 1.
+    """
+    if chunk_bytes < 1:
+        raise ValueError(f"chunk_bytes must be at least 1, got {chunk_bytes}")
+    begin = time.perf_counter()
+    records = bytes_out = 0
+    size = os.path.getsize(input_path)
+    with open(output_path, "wb") as out:
+        if size == 0:
+            return BulkStats(0, 0, 0, time.perf_counter() - begin)
+        with open(input_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            chunks = record_chunks(data, chunk_bytes)
+        n_workers = workers or os.cpu_count() or 1
+        with ProcessPoolExecutor(max_workers=n_workers) as pool:
+            in_flight = deque()
+            for start, end in chunks:
+                in_flight.append(pool.submit(_renumber_chunk, input_path, start, end, field, sources_field))
+                if len(in_flight) >= 2 * n_workers:
+                    records, bytes_out = _write(out, in_flight.popleft(), records, bytes_out)
+            while in_flight:
+                records, bytes_out = _write(out, in_flight.popleft(), records, bytes_out)
+    return BulkStats(records, size, bytes_out, time.perf_counter() - begin)
+
+
+def _write(out, future, records: int, bytes_out: int) -> tuple[int, int]:
+    rendered, n = future.result()
+    out.write(rendered)
+    return records + n, bytes_out + len(rendered)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk CS1 renumbering of JSONL corpora")
+    parser.add_argument("input")
+    parser.add_argument("output")
+    parser.add_argument("--field", default="text")
+    parser.add_argument("--sources-field", default="sources")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--chunk-mib", type=float, default=DEFAULT_CHUNK_BYTES / (1024 * 1024))
+    args = parser.parse_args()
+    stats = renumber_jsonl(
+        args.input,
+        args.output,
+        field=args.field,
+        sources_field=args.sources_field,
+        workers=args.workers,
+        chunk_bytes=max(1, int(args.chunk_mib * 1024 * 1024)),
+    )
+    mib = stats.bytes_in / (1024 * 1024)
+    print(f"{stats.records} records, {mib:.1f} MiB in {stats.seconds:.2f}s ({mib / stats.seconds:.1f} MiB/s)")
+
+
+if __name__ == "__main__":
+    main()
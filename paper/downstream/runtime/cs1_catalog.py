@@ -0,0 +1,173 @@
+"""Shared, compact source-catalog index for catalog-validated renumbering.
+
+CitationRegistry validates ids against a source_catalog, which callers
+pass as a set[str] per stream. SourceCatalogIndex stores the catalog as the
+integer suffixes of its source_N ids instead: a bitset when the numbers are
+dense, a sorted int64 array when they are sparse. Membership is an integer
+test (a bit probe or a binary search), and the index is read-only, so one
+instance can back any number of streams. share() copies it into a
+multiprocessing.shared_memory block that worker processes map with
+attach() without copying.
+
+Shared memory layout (native byte order, 8-byte aligned):
+
+    kind         uint8 + 7 pad   _BITSET or _SORTED
+    count        uint64          number of ids in the catalog
+    payload_len  uint64          payload size in bytes
+    payload                      bitset bytes, or sorted int64 numbers
+
+Only canonical source_N ids (N without leading zeros) with 0 <= N < 2**63
+can be indexed.
+"""
+
+import struct
+from array import array
+from bisect import bisect_left
+from collections.abc import Iterable
+from multiprocessing import shared_memory
+
+_BITSET = 0
+_SORTED = 1
+_HEADER = struct.Struct("=B7xQQ")
+_PREFIX = "source_"
+
+# Use a bitset while it costs at most this many bits per catalog entry.
+_MAX_BITS_PER_ENTRY = 64
+
+# Numbers are stored as int64 in the sorted layout.
+_NUMBER_LIMIT = 1 << 63
+
+
+def _parse_canonical(digits: str) -> int | None:
+    if digits.isascii() and digits.isdigit() and (digits[0] != "0" or len(digits) == 1):
+        return int(digits)
+    return None
+
+
+def _open_untracked(name: str) -> shared_memory.SharedMemory:
+    """Attach to an existing block without handing it to the resource tracker.
+
+    Before Python 3.13 attaching registers the block with the resource
+    tracker, which then unlinks it when the attaching process exits.
+    """
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        from multiprocessing import resource_tracker
+
+        shm = shared_memory.SharedMemory(name=name)
+        resource_tracker.unregister(shm._name, "shared_memory")
+        return shm
+
+
+class SourceCatalogIndex:
+    """Read-only membership index over source_N ids."""
+
+    __slots__ = ("_kind", "_data", "_count", "_limit", "_shm")
+
+    def __init__(self, source_ids: Iterable[str]) -> None:
+        """
+        Args:
+            source_ids: Catalog of source_N ids.
+
+        Raises:
+            ValueError: If an id is not a canonical source_N id, or N is
+                        2**63 or more.
+        """
+        numbers = set()
+        for sid in source_ids:
+            n = _parse_canonical(sid[len(_PREFIX):]) if sid.startswith(_PREFIX) else None
+            if n is None:
+                raise ValueError(f"not a canonical source_N id: {sid!r}")
+            numbers.add(n)
+        self._init_numbers(sorted(numbers))
+
+    @classmethod
+    def from_numbers(cls, numbers: Iterable[int]) -> "SourceCatalogIndex":
+        """Build the index from the N of each source_N directly.
+
+        Raises:
+            ValueError: If a number is outside 0 <= n < 2**63.
+        """
+        index = cls.__new__(cls)
+        index._init_numbers(sorted(set(numbers)))
+        return index
+
+    def _init_numbers(self, numbers: list[int]) -> None:
+        if numbers and not (0 <= numbers[0] and numbers[-1] < _NUMBER_LIMIT):
+            bad = numbers[0] if numbers[0] < 0 else numbers[-1]
+            raise ValueError(f"source number out of range 0 <= n < 2**63: {bad}")
+        self._count = len(numbers)
+        self._shm = None
+        if numbers and numbers[-1] + 1 > _MAX_BITS_PER_ENTRY * len(numbers):
+            self._kind = _SORTED
+            self._data = array("q", numbers)
+            self._limit = 0  # unused for sorted arrays
+        else:
+            limit = numbers[-1] + 1 if numbers else 0
+            bits = bytearray((limit + 7) // 8)
+            for n in numbers:
+                bits[n >> 3] |= 1 << (n & 7)
+            self._kind = _BITSET
+            self._data = bits
+            self._limit = limit
+
+    def __len__(self) -> int:
+        return self._count
+
+    def contains_number(self, n: int) -> bool:
+        """Return whether source_<n> is in the catalog."""
+        data = self._data
+        if self._kind == _BITSET:
+            return 0 <= n < self._limit and bool(data[n >> 3] & (1 << (n & 7)))
+        i = bisect_left(data, n)
+        return i < len(data) and data[i] == n
+
+    def contains_digits(self, digits: str) -> bool:
+        """Return whether source_<digits> is in the catalog."""
+        n = _parse_canonical(digits)
+        return n is not None and self.contains_number(n)
+
+    def __contains__(self, source_id: object) -> bool:
+        if not isinstance(source_id, str) or not source_id.startswith(_PREFIX):
+            return False
+        return self.contains_digits(source_id[len(_PREFIX):])
+
+    def share(self, name: str | None = None) -> shared_memory.SharedMemory:
+        """Copy the index into a new shared memory block and return it.
+
+        The caller owns the block: keep it alive while workers use it, then
+        close() and unlink() it.
+        """
+        payload = bytes(self._data)
+        shm = shared_memory.SharedMemory(name=name, create=True, size=_HEADER.size + max(len(payload), 1))
+        _HEADER.pack_into(shm.buf, 0, self._kind, self._count, len(payload))
+        shm.buf[_HEADER.size:_HEADER.size + len(payload)] = payload
+        return shm
+
+    @classmethod
+    def attach(cls, name: str) -> "SourceCatalogIndex":
+        """Map an index published with share() in another process."""
+        shm = _open_untracked(name)
+        kind, count, payload_len = _HEADER.unpack_from(shm.buf, 0)
+        payload = shm.buf[_HEADER.size:_HEADER.size + payload_len]
+        index = cls.__new__(cls)
+        index._kind = kind
+        index._count = count
+        index._shm = shm
+        if kind == _SORTED:
+            index._data = payload.cast("q")
+            index._limit = 0
+        else:
+            index._data = payload
+            index._limit = payload_len * 8
+        return index
+
+    def close(self) -> None:
+        """Release the mapping of an attached index."""
+        if self._shm is not None:
+            self._data = b""
+            self._count = 0
+            self._limit = 0
+            self._shm.close()
+            self._shm = None
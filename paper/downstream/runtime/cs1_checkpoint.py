@@ -0,0 +1,178 @@
+"""Binary checkpoints of CS1 renumbering state for reconnecting clients.
+
+A checkpoint captures what is needed to continue a stream exactly where it
+stopped: the allocation map, the parser's held-back text and the token
+offset. Restoring is O(state), so a reconnecting client resumes by
+restoring the latest checkpoint and replaying only the tokens after its
+offset instead of the whole stream.
+
+Layout (little-endian):
+
+    magic         4s   b"CS1K"
+    version       B    3
+    parser_kind   B    PARSER_SCANNER / PARSER_BYTE_SCANNER / PARSER_REGEX
+    flags         B    bit 0: scanner hold mode
+    scan_state    B    scanner state (0..8; 8 skips an over-long digit run);
+                       always 0 for PARSER_REGEX
+    token_offset  Q    tokens processed so far (I before version 3)
+    max_digits    I    scanner digit-run cap, 0 if unbounded (since version 2)
+    pending       I + bytes   held-back text (UTF-8)
+    tail          I + bytes   flushed text not yet returned (UTF-8)
+    sources       I + bytes   digit suffixes of the registered source_N ids
+                              in display order, comma separated
+
+Display numbers are not stored: the k-th suffix is display number k.
+max_digits is stored because it decides what the scanner does from its
+current state on; version 1 checkpoints, which lack it, decode as
+unbounded. Decoding rejects unknown parser kinds and scanner states, so a
+corrupt blob cannot restore into a state the scanner never reaches.
+Catalog and monitoring data (the invalid-id log, Finalizer observations)
+are not part of the checkpoint.
+
+CheckpointCache keeps the latest checkpoint per stream id in an LRU bounded
+by entry count and total bytes.
+"""
+
+import struct
+from collections import OrderedDict
+from collections.abc import Hashable
+from dataclasses import dataclass
+
+MAGIC = b"CS1K"
+VERSION = 3
+
+PARSER_SCANNER = 0
+PARSER_BYTE_SCANNER = 1
+PARSER_REGEX = 2
+
+_HEADER = struct.Struct("<4sBBBB")
+_OFFSET = struct.Struct("<Q")
+_OFFSET_V2 = struct.Struct("<I")
+_MAX_DIGITS = struct.Struct("<I")
+_LEN = struct.Struct("<I")
+
+# CitationScanner states (runtime/cs1_scanner.py): 0..7, and 8 for skipping
+# a digit run longer than max_digits.
+_SCAN_STATES = 9
+_SKIP_STATE = 8
+
+
+@dataclass
+class CheckpointState:
+    """Decoded checkpoint contents."""
+
+    parser_kind: int
+    hold: bool
+    scan_state: int
+    token_offset: int
+    pending: bytes
+    tail: bytes
+    source_ids: list[str]
+    max_digits: int | None = None
+
+
+def encode_checkpoint(state: CheckpointState) -> bytes:
+    """Serialize state to the checkpoint layout."""
+    if not 0 <= state.token_offset < 1 << 64:
+        raise ValueError(f"token_offset out of range: {state.token_offset}")
+    if not 0 <= (state.max_digits or 0) < 1 << 32:
+        raise ValueError(f"max_digits out of range: {state.max_digits}")
+    suffixes = ",".join(sid[len("source_"):] for sid in state.source_ids).encode()
+    parts = [
+        _HEADER.pack(MAGIC, VERSION, state.parser_kind, int(state.hold), state.scan_state),
+        _OFFSET.pack(state.token_offset),
+        _MAX_DIGITS.pack(state.max_digits or 0),
+    ]
+    for blob in (state.pending, state.tail, suffixes):
+        parts.append(_LEN.pack(len(blob)))
+        parts.append(blob)
+    return b"".join(parts)
+
+
+def decode_checkpoint(data: bytes) -> CheckpointState:
+    """Parse a checkpoint; raises ValueError if it is malformed."""
+    view = memoryview(data)
+    try:
+        magic, version, kind, flags, scan_state = _HEADER.unpack_from(view, 0)
+        if magic != MAGIC or version not in (1, 2, VERSION):
+            raise ValueError(f"not a version {VERSION} CS1 checkpoint")
+        pos = _HEADER.size
+        offset_struct = _OFFSET if version >= 3 else _OFFSET_V2
+        (offset,) = offset_struct.unpack_from(view, pos)
+        pos += offset_struct.size
+        max_digits = 0
+        if version >= 2:
+            (max_digits,) = _MAX_DIGITS.unpack_from(view, pos)
+            pos += _MAX_DIGITS.size
+        blobs = []
+        for _ in range(3):
+            (n,) = _LEN.unpack_from(view, pos)
+            pos += _LEN.size
+            if pos + n > len(view):
+                raise ValueError("truncated checkpoint")
+            blobs.append(bytes(view[pos:pos + n]))
+            pos += n
+    except struct.error as e:
+        raise ValueError(f"truncated checkpoint: {e}") from e
+    if kind not in (PARSER_SCANNER, PARSER_BYTE_SCANNER, PARSER_REGEX):
+        raise ValueError(f"unknown parser kind {kind}")
+    if scan_state >= (1 if kind == PARSER_REGEX else _SCAN_STATES):
+        raise ValueError(f"invalid scan state {scan_state} for parser kind {kind}")
+    if scan_state == _SKIP_STATE and not max_digits:
+        raise ValueError("skip state without a max_digits cap")
+
+    pending, tail, suffixes = blobs
+    source_ids = [f"source_{s}" for s in suffixes.decode().split(",")] if suffixes else []
+    return CheckpointState(
+        parser_kind=kind,
+        hold=bool(flags & 1),
+        scan_state=scan_state,
+        token_offset=offset,
+        pending=pending,
+        tail=tail,
+        source_ids=source_ids,
+        max_digits=max_digits or None,
+    )
+
+
+class CheckpointCache:
+    """LRU of the latest checkpoint per stream id."""
+
+    def __init__(self, max_entries: int = 10_000, max_bytes: int = 64 * 1024 * 1024) -> None:
+        self._entries: OrderedDict[Hashable, bytes] = OrderedDict()
+        self._max_entries = max_entries
+        self._max_bytes = max_bytes
+        self._nbytes = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def nbytes(self) -> int:
+        """Total size of the cached checkpoints."""
+        return self._nbytes
+
+    def put(self, stream_id: Hashable, checkpoint: bytes) -> None:
+        """Store checkpoint as the latest for stream_id, evicting LRU entries."""
+        old = self._entries.pop(stream_id, None)
+        if old is not None:
+            self._nbytes -= len(old)
+        self._entries[stream_id] = checkpoint
+        self._nbytes += len(checkpoint)
+        while len(self._entries) > self._max_entries or self._nbytes > self._max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._nbytes -= len(evicted)
+
+    def get(self, stream_id: Hashable) -> bytes | None:
+        """Return the latest checkpoint for stream_id, marking it recently used."""
+        checkpoint = self._entries.get(stream_id)
+        if checkpoint is not None:
+            self._entries.move_to_end(stream_id)
+        return checkpoint
+
+    def pop(self, stream_id: Hashable) -> bytes | None:
+        """Remove and return the checkpoint for a finished stream."""
+        checkpoint = self._entries.pop(stream_id, None)
+        if checkpoint is not None:
+            self._nbytes -= len(checkpoint)
+        return checkpoint
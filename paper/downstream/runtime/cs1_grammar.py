@@ -0,0 +1,127 @@
+"""Pluggable citation grammar for CS1 renumbering.
+
+The CS1 implementations hard-code source_\\d+. A deployment whose
+retrievers emit several marker styles would otherwise run one regex per
+style over every token. CitationGrammar compiles all marker patterns into a
+single alternation, so each token is scanned once whatever the number of
+styles, and the compiled grammar is shared by every renumberer using it.
+
+Each CitationPattern gives a name and a regex. If the regex defines a
+named group "id", the source id is "<name>:<id>"; otherwise it is the whole
+match. The default grammar understands:
+
+    source_3             -> "source_3"
+    [doc:abc123]         -> "doc:abc123"
+    【4†source】, 【4:0†x】 -> "ref:4"
+
+GrammarRenumberer applies a grammar per token with the numbering of
+ReferenceCitationRenumberer: ids of every style share one sequence of
+display numbers, assigned by first appearance and never changed. Markers
+split across tokens are not joined (split-boundary handling for source_N
+is provided by CitationScanner in runtime/cs1_scanner.py).
+"""
+
+import re
+import sys
+from collections.abc import Container
+from dataclasses import dataclass
+from functools import lru_cache
+
+sys.path.insert(0, __file__.rsplit("/", 2)[0])
+from runtime.cs1_alloc import label
+from runtime.cs1_stream import CitationRegistry
+
+
+@dataclass(frozen=True)
+class CitationPattern:
+    """One citation marker style.
+
+    regex must not define named groups other than "id". It may refer back
+    to "id" with (?P=id), but not to a group by number: the numbers shift
+    once the patterns are joined.
+    """
+
+    name: str
+    regex: str
+
+
+# A backslash-digit escape that is not itself escaped, e.g. \1 but not \\1.
+_NUMBERED_BACKREF = re.compile(r"(?<!\\)(?:\\\\)*\\[1-9]")
+
+
+class CitationGrammar:
+    """A set of CitationPatterns compiled into one matcher."""
+
+    def __init__(self, patterns: tuple[CitationPattern, ...]) -> None:
+        if not patterns:
+            raise ValueError("a citation grammar needs at least one pattern")
+        alternatives: list[str] = []
+        # Outer group name -> (id group name or None, source id prefix)
+        self._groups: dict[str, tuple[str | None, str]] = {}
+        for i, pattern in enumerate(patterns):
+            groups = re.compile(pattern.regex).groupindex
+            if set(groups) - {"id"}:
+                raise ValueError(f"pattern {pattern.name!r} defines named groups other than 'id'")
+            if _NUMBERED_BACKREF.search(pattern.regex):
+                raise ValueError(f"pattern {pattern.name!r} has a numbered backreference; use (?P=id)")
+            body = pattern.regex.replace("(?P<id>", f"(?P<id{i}>").replace("(?P=id)", f"(?P=id{i})")
+            id_group = f"id{i}" if groups else None
+            alternatives.append(f"(?P<m{i}>{body})")
+            self._groups[f"m{i}"] = (id_group, f"{pattern.name}:")
+        self.patterns = patterns
+        self.regex = re.compile("|".join(alternatives))
+
+    def source_id(self, match: re.Match) -> str:
+        """Source id of a match produced by self.regex."""
+        id_group, prefix = self._groups[match.lastgroup]
+        if id_group is None:
+            return match.group(0)
+        return prefix + match.group(id_group)
+
+
+@lru_cache(maxsize=None)
+def compile_grammar(patterns: tuple[CitationPattern, ...]) -> CitationGrammar:
+    """Return the shared CitationGrammar for patterns, compiling it once."""
+    return CitationGrammar(patterns)
+
+
+DEFAULT_PATTERNS = (
+    CitationPattern("source", r"source_\d+"),
+    CitationPattern("doc", r"\[doc:(?P<id>[A-Za-z0-9_\-]+)\]"),
+    CitationPattern("ref", r"【(?P<id>\d+)(?::\d+)?†[^】]*】"),
+)
+DEFAULT_GRAMMAR = compile_grammar(DEFAULT_PATTERNS)
+
+
+class GrammarRenumberer:
+    """
+    Per-token renumbering of every marker style in a CitationGrammar.
+
+    Implements the required interface: process_token / get_source_list.
+    """
+
+    def __init__(
+        self,
+        grammar: CitationGrammar = DEFAULT_GRAMMAR,
+        source_catalog: Container[str] | None = None,
+    ) -> None:
+        self._grammar = grammar
+        self._registry = CitationRegistry(source_catalog=source_catalog)
+
+    def process_token(self, token: str) -> str:
+        """Process one streaming token; return it with markers renumbered."""
+        grammar = self._grammar
+        parts: list[str] = []
+        pos = 0
+        for match in grammar.regex.finditer(token):
+            parts.append(token[pos:match.start()])
+            num = self._registry.resolve_num(grammar.source_id(match))
+            parts.append("[?]" if num is None else label(num))
+            pos = match.end()
+        if not parts:
+            return token
+        parts.append(token[pos:])
+        return "".join(parts)
+
+    def get_source_list(self) -> list[tuple[int, str]]:
+        return self._registry.get_ordered()
@@ -0,0 +1,107 @@
+"""Async prefetch of source metadata during streaming.
+
+get_source_list() returns bare source ids; a renderer that resolves titles
+and URLs afterwards delays the reference panel by a full lookup round trip.
+MetadataPrefetcher starts each lookup as soon as an id is allocated and
+completes it while the rest of the answer streams.
+
+A prefetcher wraps a batch resolver,
+
+    async def resolver(source_ids: list[str]) -> Mapping[str, Metadata]
+
+and is meant to be shared by all concurrent streams of an event loop.
+request() returns one future per id: requests for an id that is already
+in flight or resolved share its future, and ids requested during the same
+event loop iteration, from any stream, go to the resolver together in
+batches of at most max_batch. Ids the resolver omits, or whose batch
+raised or was cancelled, resolve to None; failed ids are not cached. A
+resolver exception is logged with the batch's ids before its waiters are
+settled.
+
+AsyncCitationStream (runtime/cs1_async.py) calls request() for every
+number allocated while it renumbers and exposes the result as
+enriched_source_list once the stream ends.
+"""
+
+import asyncio
+import logging
+from collections.abc import Awaitable, Callable, Mapping
+from typing import Any, NamedTuple
+
+Metadata = Mapping[str, Any]
+Resolver = Callable[[list[str]], Awaitable[Mapping[str, Metadata]]]
+
+logger = logging.getLogger(__name__)
+
+
+class EnrichedSource(NamedTuple):
+    num: int
+    source_id: str
+    metadata: Metadata | None
+
+
+class MetadataPrefetcher:
+    """Batched, deduplicated metadata lookups shared across streams."""
+
+    def __init__(self, resolver: Resolver, max_batch: int = 64, max_cached: int = 100_000) -> None:
+        """
+        Args:
+            resolver: Async function resolving a list of source ids.
+            max_batch: Most ids passed to one resolver call.
+            max_cached: Resolved ids kept for reuse by later streams.
+        """
+        self._resolver = resolver
+        self._max_batch = max_batch
+        self._max_cached = max_cached
+        self._futures: dict[str, asyncio.Future] = {}
+        self._queued: list[str] = []
+        self._tasks: set[asyncio.Task] = set()
+
+    def request(self, source_id: str) -> asyncio.Future:
+        """Start (or join) the lookup of source_id; must run in the event loop."""
+        future = self._futures.get(source_id)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = self._futures[source_id] = loop.create_future()
+            if not self._queued:
+                loop.call_soon(self._dispatch)
+            self._queued.append(source_id)
+            self._evict()
+        return future
+
+    async def resolve(self, source_ids: list[str]) -> list[Metadata | None]:
+        """Metadata for source_ids, in order."""
+        return list(await asyncio.gather(*(self.request(sid) for sid in source_ids)))
+
+    def _dispatch(self) -> None:
+        queued, self._queued = self._queued, []
+        for i in range(0, len(queued), self._max_batch):
+            task = asyncio.ensure_future(self._resolve_batch(queued[i:i + self._max_batch]))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _resolve_batch(self, batch: list[str]) -> None:
+        found: Mapping[str, Metadata] = {}
+        failed = True
+        try:
+            found = await self._resolver(batch)
+            failed = False
+        except Exception:
+            logger.exception("metadata lookup failed for %d source ids: %s", len(batch), ", ".join(batch))
+        finally:
+            # Also runs on cancellation, so no waiter is left hanging.
+            for sid in batch:
+                future = self._futures.get(sid)
+                if future is not None and not future.done():
+                    future.set_result(found.get(sid))
+                if failed:
+                    # Let a later stream retry instead of caching the failure.
+                    self._futures.pop(sid, None)
+
+    def _evict(self) -> None:
+        futures = self._futures
+        while len(futures) > self._max_cached:
+            oldest = next(iter(futures))
+            if not futures[oldest].done():
+                break
+            del futures[oldest]
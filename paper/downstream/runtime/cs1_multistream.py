@@ -0,0 +1,228 @@
+"""Multi-stream citation renumbering engine for CS1.
+
+One MultiStreamRenumberer multiplexes many in-flight RAG answers by
+stream_id. Per-stream state is kept in a __slots__ object whose allocation
+map is an array of source numbers in first-appearance order, instead of the
+per-instance dicts, event logs and emitted-text buffers of the
+CitationRenumberer implementations. Finished streams are closed and their
+state objects are recycled through a bounded free list. An optional
+SourceCatalogIndex, shared by all streams, restricts numbering to catalog
+ids; other ids render as [?] and receive no number.
+
+Numbering semantics are those of ReferenceCitationRenumberer: every
+source_N inside a token is replaced by [k], where k is assigned per stream by
+order of first appearance and never changes.
+"""
+
+import re
+import sys
+from array import array
+from collections.abc import Hashable
+
+sys.path.insert(0, __file__.rsplit("/", 2)[0])
+from interfaces.cs1_interface import CitationRenumberer
+from runtime.cs1_alloc import label
+from runtime.cs1_catalog import SourceCatalogIndex
+
+_SOURCE_RE = re.compile(r"source_(\d+)")
+
+# Above this many distinct sources a stream switches from a linear scan of
+# its number array to a dict index. Retrieval top-k keeps most streams below.
+_INDEX_THRESHOLD = 16
+
+# Longest digit run stored as an int; longer ids go through the string path.
+_MAX_INT_DIGITS = 18
+
+
+class _StreamState:
+    """Compact allocation state for one stream.
+
+    numbers holds one entry per display number (k - 1 is the position).
+    Canonical ids (source_N with N in ASCII digits, no leading zeros) are stored
+    as N itself. Any other id, such as source_007, is stored as -(j + 1)
+    where j indexes the lazily created extra list of raw id strings, so that
+    source_7 and source_007 stay distinct exactly as in the reference.
+    """
+
+    __slots__ = ("numbers", "extra", "index")
+
+    def __init__(self) -> None:
+        self.numbers: array = array("q")
+        self.extra: list[str] | None = None
+        self.index: dict[int, int] | None = None
+
+    def reset(self) -> None:
+        del self.numbers[:]
+        self.extra = None
+        self.index = None
+
+    def allocate(self, digits: str) -> int:
+        """Return the display number for source_<digits>, allocating on first use."""
+        if (
+            len(digits) <= _MAX_INT_DIGITS
+            and digits.isascii()
+            and (digits[0] != "0" or len(digits) == 1)
+        ):
+            key = int(digits)
+        else:
+            key = self._extra_key("source_" + digits)
+
+        index = self.index
+        if index is not None:
+            k = index.get(key)
+            if k is not None:
+                return k
+        else:
+            try:
+                return self.numbers.index(key) + 1
+            except ValueError:
+                pass
+
+        self.numbers.append(key)
+        k = len(self.numbers)
+        if index is not None:
+            index[key] = k
+        elif k > _INDEX_THRESHOLD:
+            self.index = {n: i + 1 for i, n in enumerate(self.numbers)}
+        return k
+
+    def _extra_key(self, source_id: str) -> int:
+        extra = self.extra
+        if extra is None:
+            extra = self.extra = []
+        try:
+            return -(extra.index(source_id) + 1)
+        except ValueError:
+            extra.append(source_id)
+            return -len(extra)
+
+    def source_list(self, start: int = 0) -> list[tuple[int, str]]:
+        extra = self.extra
+        return [
+            (k, f"source_{n}" if n >= 0 else extra[-n - 1])
+            for k, n in enumerate(self.numbers[start:], start + 1)
+        ]
+
+
+class MultiStreamRenumberer:
+    """Renumber citations for many concurrent streams in one object.
+
+    Streams are opened implicitly by their first process_token call and
+    must be closed with close() once the answer is complete, which returns
+    the final source list and recycles the stream's state.
+    """
+
+    def __init__(
+        self, max_pooled: int = 1024, catalog: SourceCatalogIndex | None = None
+    ) -> None:
+        """
+        Args:
+            max_pooled: Upper bound on recycled state objects kept for reuse
+                        by newly opened streams.
+            catalog: Optional catalog of valid source ids, checked by integer
+                     lookup on the parsed N.
+        """
+        self._catalog = catalog
+        self._streams: dict[Hashable, _StreamState] = {}
+        self._pool: list[_StreamState] = []
+        self._max_pooled = max_pooled
+
+    def __len__(self) -> int:
+        """Number of open streams."""
+        return len(self._streams)
+
+    def __contains__(self, stream_id: Hashable) -> bool:
+        return stream_id in self._streams
+
+    def process_token(self, stream_id: Hashable, token: str) -> str:
+        """Process one token of the given stream.
+
+        Args:
+            stream_id: Identifier of the stream the token belongs to.
+            token: A text token from the LLM stream.
+
+        Returns:
+            The token with source references replaced by display numbers.
+        """
+        state = self._streams.get(stream_id)
+        if state is None:
+            state = self._open(stream_id)
+        if "source_" not in token:
+            return token
+
+        catalog = self._catalog
+        parts: list[str] = []
+        pos = 0
+        for match in _SOURCE_RE.finditer(token):
+            parts.append(token[pos:match.start()])
+            digits = match.group(1)
+            if catalog is not None and not catalog.contains_digits(digits):
+                parts.append("[?]")
+            else:
+                parts.append(label(state.allocate(digits)))
+            pos = match.end()
+        parts.append(token[pos:])
+        return "".join(parts)
+
+    def get_source_list(self, stream_id: Hashable) -> list[tuple[int, str]]:
+        """Return the (display_number, source_id) list of an open stream.
+
+        Unknown or already closed streams have an empty source list.
+        """
+        state = self._streams.get(stream_id)
+        if state is None:
+            return []
+        return state.source_list()
+
+    def source_list_version(self, stream_id: Hashable) -> int:
+        """Number of sources allocated so far in the stream."""
+        state = self._streams.get(stream_id)
+        return 0 if state is None else len(state.numbers)
+
+    def get_source_list_since(self, stream_id: Hashable, version: int) -> list[tuple[int, str]]:
+        """Return the pairs allocated after version (a previous list length).
+
+        A stream's source list is append-only, so the version is simply the
+        number of sources already seen; the cost is O(new entries).
+        """
+        state = self._streams.get(stream_id)
+        if state is None:
+            return []
+        return state.source_list(version)
+
+    def close(self, stream_id: Hashable) -> list[tuple[int, str]]:
+        """Finish a stream: return its source list and recycle its state."""
+        state = self._streams.pop(stream_id, None)
+        if state is None:
+            return []
+        sources = state.source_list()
+        if len(self._pool) < self._max_pooled:
+            state.reset()
+            self._pool.append(state)
+        return sources
+
+    def stream(self, stream_id: Hashable) -> "StreamHandle":
+        """Return a CitationRenumberer view bound to one stream."""
+        return StreamHandle(self, stream_id)
+
+    def _open(self, stream_id: Hashable) -> _StreamState:
+        state = self._pool.pop() if self._pool else _StreamState()
+        self._streams[stream_id] = state
+        return state
+
+
+class StreamHandle(CitationRenumberer):
+    """Single-stream CitationRenumberer backed by a MultiStreamRenumberer."""
+
+    def __init__(self, engine: MultiStreamRenumberer, stream_id: Hashable) -> None:
+        self._engine = engine
+        self._stream_id = stream_id
+
+    def process_token(self, token: str) -> str:
+        return self._engine.process_token(self._stream_id, token)
+
+    def get_source_list(self) -> list[tuple[int, str]]:
+        return self._engine.get_source_list(self._stream_id)
+
+    def close(self) -> list[tuple[int, str]]:
+        return self._engine.close(self._stream_id)
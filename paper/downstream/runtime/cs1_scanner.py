@@ -0,0 +1,251 @@
+"""Incremental state-machine scanner for source_N citations.
+
+CitationScanner is a drop-in replacement for StreamParser (runtime/cs1_stream.py).
+StreamParser re-runs _PARTIAL_RE.search and _SOURCE_RE.finditer over the
+whole held-back buffer on every feed, so character-level token streams
+rescan the same text repeatedly. The scanner instead carries its match
+state across tokens:
+
+    state 0      : outside a citation; _START_RE finds the next prefix
+    state 1..6   : the token ended after the first `state` characters of
+                   "source_"; the next token must continue the prefix
+    state 7      : matched "source_", consuming digits
+    state 8      : skipping the rest of an over-long digit run (max_digits)
+
+Held-back text is never rescanned: a new token is only matched against
+the remainder of the prefix or the digit run. Because "s" occurs only at
+the start of "source_", a failed prefix never has to back up, so every
+input character is examined a bounded number of times (at most once per
+prefix position) and total work is linear in the stream length.
+
+With hold=False the scanner treats every token as complete, which gives
+the per-token re.sub semantics of ReferenceCitationRenumberer.
+
+max_digits bounds the lookahead. Without it, "source_" followed by an
+endless digit run is held back in full. With it, a digit run longer than
+max_digits is not a citation: the text is emitted literally as soon as the
+run exceeds the cap, and the rest of the run passes through as text. The
+held-back buffer is then never longer than len("source_") + max_digits,
+whatever the input. A retriever's top-k bounds real ids, so a cap of a few
+digits costs nothing on genuine answers.
+
+ByteCitationScanner runs the same state machine over UTF-8 bytes or a
+memoryview. "source_" and its digits are ASCII, and UTF-8 never uses ASCII
+byte values inside a multi-byte character, so chunks are scanned without
+decoding and a character split across chunks simply passes through. Its
+text events are memoryview slices of the input. Only ASCII digits end a
+citation in bytes mode, whereas the str regex also accepts other Unicode
+decimal digits.
+"""
+
+import re
+
+_PREFIX_LEN = len("source_")
+_SKIP = _PREFIX_LEN + 1
+
+
+def _continuations(prefix: str) -> list[str]:
+    """Patterns continuing a prefix carried over after its first k characters.
+
+    Entry k matches the rest of "source_", or a shorter part of the rest
+    that runs to the end of the token (the prefix is then still open).
+    """
+    patterns = [""]
+    for k in range(1, len(prefix)):
+        rest = prefix[k:]
+        alternatives = [rest] + [rest[:j] + r"\Z" for j in range(len(rest) - 1, 0, -1)]
+        patterns.append("|".join(alternatives))
+    return patterns
+
+
+# A full "source_" prefix, or a proper prefix of it cut off by the token end.
+_START = r"source_|s(?:o(?:u(?:r(?:c(?:e)?)?)?)?)?\Z"
+_CONTINUE = _continuations("source_")
+
+
+class CitationScanner:
+    """Incremental source_N scanner with the StreamParser feed/flush API."""
+
+    __slots__ = ("_state", "_pending", "_hold", "_max_digits")
+
+    _EMPTY = ""
+    _START_RE = re.compile(_START)
+    _CONTINUE_RES = [re.compile(p) for p in _CONTINUE]
+    _DIGITS_RE = re.compile(r"\d*")
+
+    def __init__(self, hold: bool = True, max_digits: int | None = None) -> None:
+        """
+        Args:
+            hold: Hold back a tail that may still become a citation until the
+                  next token arrives (split-boundary aware). When False, each
+                  token is scanned on its own, as re.sub would.
+            max_digits: Longest digit run accepted as a source number; longer
+                  runs are literal text. None accepts any length.
+        """
+        if max_digits is not None and max_digits < 1:
+            raise ValueError(f"max_digits must be at least 1, got {max_digits}")
+        self._state = 0
+        # Text of the open partial match: the prefix so far plus any digits.
+        self._pending = self._EMPTY
+        self._hold = hold
+        self._max_digits = max_digits
+
+    @property
+    def pending(self) -> str:
+        """Text currently held back."""
+        return self._pending
+
+    @property
+    def hold(self) -> bool:
+        return self._hold
+
+    @property
+    def max_digits(self) -> int | None:
+        return self._max_digits
+
+    def snapshot(self) -> tuple[int, str]:
+        """Return (state, pending) for checkpointing."""
+        return self._state, self._pending
+
+    def restore(self, state: int, pending: str) -> None:
+        """Resume from a snapshot() taken earlier."""
+        self._state = state
+        self._pending = pending
+
+    def feed(self, token: str) -> list[tuple[str, str]]:
+        """
+        Feed a token; return list of (kind, value) pairs where:
+          - ('text', s)      — literal text safe to emit
+          - ('cite', id)     — a complete citation with given source id
+        """
+        events = []
+        state = self._state
+        # Start of the open match in token; -1 while it began in an earlier token.
+        match_start = -1 if state else 0
+        text_start = 0
+        i = 0
+        n = len(token)
+
+        if state == _SKIP:
+            # Digits continuing an over-long run are literal text.
+            i = self._DIGITS_RE.match(token).end()
+            if i == n:
+                return [("text", token)] if n else []
+            match_start = 0
+            state = 0
+        elif 0 < state < _PREFIX_LEN and n:
+            # Continue a prefix carried over from the previous token.
+            m = self._CONTINUE_RES[state].match(token)
+            if m is not None:
+                i = m.end()
+                state += i
+            else:
+                # The carried text is literal; the token holds no part of
+                # the match since "s" never recurs inside "source_".
+                events.append(("text", self._pending))
+                self._pending = self._EMPTY
+                match_start = 0
+                state = 0
+
+        while i < n:
+            if state == 0:
+                m = self._START_RE.search(token, i)
+                if m is None:
+                    break
+                match_start = m.start()
+                i = m.end()
+                state = i - match_start
+            else:
+                end = self._DIGITS_RE.match(token, i).end()
+                if self._max_digits is not None and (
+                    (len(self._pending) + end if match_start < 0 else end - match_start)
+                    > _PREFIX_LEN + self._max_digits
+                ):
+                    # Too many digits for a source number: literal text.
+                    if match_start < 0:
+                        events.append(("text", self._pending))
+                        self._pending = self._EMPTY
+                        match_start = 0
+                    i = end
+                    state = _SKIP if end == n else 0
+                    continue
+                if end == n:
+                    i = n
+                    break
+                if end == i and (match_start >= 0 or len(self._pending) + i == _PREFIX_LEN):
+                    # "source_" not followed by a digit.
+                    if match_start < 0:
+                        events.append(("text", self._pending))
+                        self._pending = self._EMPTY
+                        match_start = 0
+                    state = 0
+                    continue
+                if match_start < 0:
+                    cite = self._pending + token[:end]
+                    self._pending = self._EMPTY
+                else:
+                    if text_start < match_start:
+                        events.append(("text", token[text_start:match_start]))
+                    cite = token[match_start:end]
+                events.append(("cite", cite))
+                text_start = i = end
+                state = 0
+
+        if 0 < state < _SKIP:
+            # Concatenating onto _EMPTY copies memoryview slices into owned
+            # bytes; for str it returns the slice itself.
+            if match_start < 0:
+                self._pending = self._pending + token
+            else:
+                if text_start < match_start:
+                    events.append(("text", token[text_start:match_start]))
+                self._pending = self._EMPTY + token[match_start:]
+        elif text_start < n:
+            events.append(("text", token[text_start:]))
+        self._state = state
+
+        if not self._hold and state:
+            events.extend(self.flush())
+        return events
+
+    def release(self) -> list[tuple[str, str]]:
+        """Give up a held-back prefix that has no digits yet, as text.
+
+        Returns [] when nothing is held or the held text already has digits:
+        that is a citation whose id may still grow, so it stays pending.
+        """
+        pending = self._pending
+        if not pending or len(pending) > _PREFIX_LEN:
+            return []
+        self._state = 0
+        self._pending = self._EMPTY
+        return [("text", pending)]
+
+    def flush(self) -> list[tuple[str, str]]:
+        """Flush the held-back partial match (call at stream end)."""
+        pending = self._pending
+        complete = self._state == _PREFIX_LEN and len(pending) > _PREFIX_LEN
+        self._state = 0
+        if not pending:
+            return []
+        self._pending = self._EMPTY
+        return [("cite" if complete else "text", pending)]
+
+
+class ByteCitationScanner(CitationScanner):
+    """CitationScanner over UTF-8 bytes / memoryview chunks.
+
+    Event values are memoryview slices of the fed chunk, or bytes where they
+    include held-back text; decode a 'cite' value with str(value, "ascii").
+    """
+
+    __slots__ = ()
+
+    _EMPTY = b""
+    _START_RE = re.compile(_START.encode())
+    _CONTINUE_RES = [re.compile(p.encode()) for p in _CONTINUE]
+    _DIGITS_RE = re.compile(rb"[0-9]*")
+
+    def feed(self, token: bytes | memoryview) -> list[tuple[str, bytes | memoryview]]:
+        """Feed a bytes-like chunk; see CitationScanner.feed."""
+        return super().feed(memoryview(token).cast("B"))
@@ -0,0 +1,327 @@
+#!/usr/bin/env python3
+"""Process-pool CS1 renumbering service sharded by stream.
+
+A front process accepts token frames over a Unix socket and shards streams
+across N worker processes by hashing the stream id, so each stream's
+renumbering state stays pinned to one worker. Each worker owns one
+MultiStreamRenumberer (runtime/cs1_multistream.py).
+
+Frames in both directions are a header followed by the stream id and body:
+
+    kind       uint8    TOKEN / CLOSE (client), TEXT / SOURCES / ERROR (service)
+    id_len     uint16   length of the UTF-8 stream id
+    body_len   uint32   length of the UTF-8 body
+    stream_id, body
+
+TOKEN carries one token and is answered by a TEXT frame with the renumbered
+token. CLOSE finishes a stream and is answered by a SOURCES frame whose body
+is the JSON source list. Stream ids are scoped to the client connection:
+workers key state by (connection, stream id), so two clients may use the
+same id, and streams a client leaves open when it disconnects are closed
+for it. Responses for a stream arrive in request order. If a worker dies,
+every request queued or in flight on it, and every later request sharded
+to it, is answered by an ERROR frame whose body is the reason.
+
+The front keeps at most one batch in flight per worker. Frames arriving
+while a worker is busy are queued and sent as the next batch, which
+amortizes IPC cost under load and means neither side can block the other
+on a full pipe.
+
+Usage:
+    python3 paper/downstream/runtime/cs1_service.py --socket /tmp/cs1.sock --workers 4
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing as mp
+import os
+import struct
+import sys
+import zlib
+from itertools import count
+
+sys.path.insert(0, __file__.rsplit("/", 2)[0])
+from runtime.cs1_multistream import MultiStreamRenumberer
+
+TOKEN = 1
+CLOSE = 2
+TEXT = 1
+SOURCES = 2
+ERROR = 3
+
+_HEADER = struct.Struct("<BHI")
+
+# Seconds close() waits for a worker to exit before terminating it.
+_JOIN_TIMEOUT = 5.0
+
+
+class ServiceError(RuntimeError):
+    """A request failed in the service; raised by ServiceClient.receive()."""
+
+    def __init__(self, stream_id: str, reason: str) -> None:
+        super().__init__(f"stream {stream_id!r}: {reason}")
+        self.stream_id = stream_id
+
+
+def encode_frame(kind: int, stream_id: str, body: str) -> bytes:
+    sid = stream_id.encode()
+    data = body.encode()
+    return _HEADER.pack(kind, len(sid), len(data)) + sid + data
+
+
+async def read_frame(reader: asyncio.StreamReader) -> tuple[int, str, str]:
+    """Read one frame; raises asyncio.IncompleteReadError at end of stream."""
+    kind, id_len, body_len = _HEADER.unpack(await reader.readexactly(_HEADER.size))
+    payload = await reader.readexactly(id_len + body_len)
+    return kind, payload[:id_len].decode(), payload[id_len:].decode()
+
+
+def shard_of(stream_id: str, n_workers: int) -> int:
+    """Worker index for stream_id; stable across processes and runs."""
+    return zlib.crc32(stream_id.encode()) % n_workers
+
+
+def _worker_main(conn) -> None:
+    engine = MultiStreamRenumberer()
+    while True:
+        batch = conn.recv()
+        if batch is None:
+            break
+        results = []
+        for conn_key, kind, stream_id, body in batch:
+            key = (conn_key, stream_id)
+            if kind == TOKEN:
+                results.append((conn_key, TEXT, stream_id, engine.process_token(key, body)))
+            else:
+                results.append((conn_key, SOURCES, stream_id, json.dumps(engine.close(key))))
+        conn.send(results)
+    conn.close()
+
+
+class _Worker:
+    __slots__ = ("process", "conn", "pending", "in_flight", "busy", "dead")
+
+    def __init__(self, ctx) -> None:
+        self.conn, child = ctx.Pipe()
+        self.process = ctx.Process(target=_worker_main, args=(child,), daemon=True)
+        self.process.start()
+        child.close()
+        self.pending: list[tuple[int, int, str, str]] = []
+        self.in_flight: list[tuple[int, int, str, str]] = []
+        self.busy = False
+        self.dead = False
+
+
+class RenumberingService:
+    """Front process: Unix socket server dispatching to sharded workers."""
+
+    def __init__(self, path: str, n_workers: int | None = None) -> None:
+        self._path = path
+        self._n_workers = n_workers or os.cpu_count() or 1
+        self._workers: list[_Worker] = []
+        self._writers: dict[int, asyncio.StreamWriter] = {}
+        self._conn_keys = count()
+        self._handlers: set[asyncio.Task] = set()
+        self._closing = False
+        self._server: asyncio.AbstractServer | None = None
+
+    @property
+    def n_workers(self) -> int:
+        return self._n_workers
+
+    async def start(self) -> None:
+        loop = asyncio.get_running_loop()
+        ctx = mp.get_context()
+        for _ in range(self._n_workers):
+            worker = _Worker(ctx)
+            loop.add_reader(worker.conn.fileno(), self._on_results, worker)
+            self._workers.append(worker)
+        if os.path.exists(self._path):
+            os.unlink(self._path)
+        self._server = await asyncio.start_unix_server(self._handle, path=self._path)
+
+    async def serve_forever(self) -> None:
+        await self.start()
+        try:
+            await self._server.serve_forever()
+        finally:
+            await self.close()
+
+    async def close(self) -> None:
+        """Disconnect clients, then stop the workers.
+
+        Requests still queued are dropped. Results of batches in flight are
+        read (and discarded) while the workers exit, so a worker never
+        blocks on a full pipe; one that does not exit within _JOIN_TIMEOUT
+        seconds is terminated.
+        """
+        self._closing = True
+        server, self._server = self._server, None
+        if server is not None:
+            server.close()
+        for writer in list(self._writers.values()):
+            writer.close()
+        if self._handlers:
+            await asyncio.gather(*self._handlers, return_exceptions=True)
+        if server is not None:
+            await server.wait_closed()
+
+        loop = asyncio.get_running_loop()
+        for worker in self._workers:
+            worker.pending = []
+            if not worker.dead:
+                try:
+                    worker.conn.send(None)
+                except OSError:
+                    pass
+        for worker in self._workers:
+            await loop.run_in_executor(None, worker.process.join, _JOIN_TIMEOUT)
+            if worker.process.is_alive():
+                worker.process.terminate()
+                await loop.run_in_executor(None, worker.process.join)
+            if not worker.dead:
+                worker.dead = True
+                loop.remove_reader(worker.conn.fileno())
+            worker.conn.close()
+        self._workers = []
+        if os.path.exists(self._path):
+            os.unlink(self._path)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        task = asyncio.current_task()
+        self._handlers.add(task)
+        conn_key = next(self._conn_keys)
+        self._writers[conn_key] = writer
+        open_streams: set[str] = set()
+        try:
+            while True:
+                try:
+                    kind, stream_id, body = await read_frame(reader)
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    break
+                if kind == TOKEN:
+                    open_streams.add(stream_id)
+                else:
+                    open_streams.discard(stream_id)
+                self._submit((conn_key, kind, stream_id, body))
+                # Stop reading while this client is not consuming responses.
+                try:
+                    await writer.drain()
+                except ConnectionError:
+                    break
+        finally:
+            self._handlers.discard(task)
+            del self._writers[conn_key]
+            writer.close()
+            # Release the state of streams the client did not close itself.
+            for stream_id in open_streams:
+                self._submit((conn_key, CLOSE, stream_id, ""))
+
+    def _submit(self, request: tuple[int, int, str, str]) -> None:
+        if self._closing:
+            return  # workers and their stream state are going away
+        worker = self._workers[shard_of(request[2], len(self._workers))]
+        if worker.dead:
+            self._fail([request], "worker process exited")
+            return
+        worker.pending.append(request)
+        if not worker.busy:
+            self._dispatch(worker)
+
+    def _dispatch(self, worker: _Worker) -> None:
+        batch, worker.pending = worker.pending, []
+        worker.busy = True
+        worker.in_flight = batch
+        try:
+            worker.conn.send(batch)
+        except OSError:
+            self._worker_died(worker)
+
+    def _worker_died(self, worker: _Worker) -> None:
+        if worker.dead:
+            return
+        worker.dead = True
+        asyncio.get_running_loop().remove_reader(worker.conn.fileno())
+        requests = worker.in_flight + worker.pending
+        worker.in_flight, worker.pending = [], []
+        self._fail(requests, "worker process exited")
+
+    def _fail(self, requests: list[tuple[int, int, str, str]], reason: str) -> None:
+        writers = self._writers
+        for conn_key, _, stream_id, _ in requests:
+            writer = writers.get(conn_key)
+            if writer is not None:
+                writer.write(encode_frame(ERROR, stream_id, reason))
+
+    def _on_results(self, worker: _Worker) -> None:
+        try:
+            results = worker.conn.recv()
+        except (EOFError, OSError):
+            self._worker_died(worker)
+            return
+        worker.in_flight = []
+        writers = self._writers
+        for conn_key, kind, stream_id, body in results:
+            writer = writers.get(conn_key)
+            if writer is not None:
+                writer.write(encode_frame(kind, stream_id, body))
+        worker.busy = False
+        if worker.pending and not self._closing:
+            self._dispatch(worker)
+
+
+class ServiceClient:
+    """Minimal asyncio client for RenumberingService."""
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self._reader = reader
+        self._writer = writer
+
+    @classmethod
+    async def connect(cls, path: str) -> "ServiceClient":
+        reader, writer = await asyncio.open_unix_connection(path)
+        return cls(reader, writer)
+
+    def send_token(self, stream_id: str, token: str) -> None:
+        self._writer.write(encode_frame(TOKEN, stream_id, token))
+
+    def close_stream(self, stream_id: str) -> None:
+        self._writer.write(encode_frame(CLOSE, stream_id, ""))
+
+    async def drain(self) -> None:
+        await self._writer.drain()
+
+    async def receive(self) -> tuple[int, str, str | list[tuple[int, str]]]:
+        """Return (kind, stream_id, text) or (SOURCES, stream_id, source_list).
+
+        Raises:
+            ServiceError: If the service failed the request.
+        """
+        kind, stream_id, body = await read_frame(self._reader)
+        if kind == ERROR:
+            raise ServiceError(stream_id, body)
+        if kind == SOURCES:
+            return kind, stream_id, [tuple(pair) for pair in json.loads(body)]
+        return kind, stream_id, body
+
+    async def close(self) -> None:
+        self._writer.close()
+        await self._writer.wait_closed()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CS1 renumbering service")
+    parser.add_argument("--socket", default="/tmp/cs1-renumber.sock")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+    service = RenumberingService(args.socket, args.workers)
+    print(f"Serving on {args.socket} with {service.n_workers} workers")
+    try:
+        asyncio.run(service.serve_forever())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""Thread- and task-safe citation registry shared by parallel generations.
+
+When several candidate answers are generated in parallel (n > 1 choices,
+parallel tool-call branches) they must share one numbering: the first
+answer to cite an id fixes its number for all of them. CitationRegistry
+is not safe for that, because its check-then-assign allocation can hand
+the same number to two ids.
+
+SharedCitationRegistry keeps the CitationRegistry API. Ids that already
+have a number are looked up with a single dict read and no lock. Only a
+miss takes the lock, re-checks and assigns, so each id is numbered exactly
+once in first-appearance order. The ordered list is appended before the id
+is published in the map, so a reader that sees a number also sees its list
+entry. The lock is never held across an await, so asyncio tasks on one
+loop and threads across loops can share one instance.
+
+Give each producer its own StreamingRenumberer (parser and Finalizer are
+per stream) built with registry=shared.
+"""
+
+import sys
+import threading
+from collections.abc import Container
+
+sys.path.insert(0, __file__.rsplit("/", 2)[0])
+from runtime.cs1_stream import CitationRegistry
+
+
+class SharedCitationRegistry(CitationRegistry):
+    """CitationRegistry with atomic first-appearance allocation."""
+
+    def __init__(self, source_catalog: Container[str] | None = None) -> None:
+        super().__init__(source_catalog=source_catalog)
+        self._lock = threading.Lock()
+
+    def resolve_num(self, source_id: str) -> int | None:
+        # Lock-free read path for ids that already have a number.
+        num = self._id_to_num.get(source_id)
+        if num is not None:
+            return num
+        if self._catalog is not None and source_id not in self._catalog:
+            self._invalid_log.append(source_id)
+            return None
+
+        with self._lock:
+            num = self._id_to_num.get(source_id)
+            if num is None:
+                num = self._next_num
+                self._next_num += 1
+                self._ordered.append((num, source_id))
+                # Publish last: readers never see a number without its entry.
+                self._id_to_num[source_id] = num
+        return num
+
+    def get_ordered(self) -> list[tuple[int, str]]:
+        """Return [(num, source_id), ...] in registration order."""
+        with self._lock:
+            return list(self._ordered)
+
+    def clear(self) -> None:
+        """Forget every registration; callers must stop producers first."""
+        with self._lock:
+            super().clear()
@@ -0,0 +1,255 @@
+"""Opt-in per-stream profiling for StreamingRenumberer.
+
+InstrumentedRenumberer is a StreamingRenumberer subclass that records, per
+stream:
+
+    scan_ns / alloc_ns / render_ns   time in the parser, in registry
+                                     allocation and in rendering the rest
+    citations, distinct_sources      citation events and registered ids
+    max_pending                      held-back buffer high-water mark
+    delayed_chars, delay_ns,         characters that were held back past the
+    max_delay_ns                     token they arrived in, and the total and
+                                     longest wall time they waited
+
+Profiling is opt-in by construction: StreamingRenumberer itself carries no
+instrumentation, so streams that do not use this class pay nothing.
+
+stats() returns a StreamStats snapshot. A StatsCollector passed to several
+renumberers aggregates them: times and counts are summed, high-water marks
+and the longest delay take the maximum. The collector holds only the stats
+of live streams; when a renumberer is garbage collected or reset(), its
+stats are merged into a running total, so a long-running server's
+collector does not grow with the number of streams it has served.
+
+The structured-event path (process_token_events, flush_events) and
+release_pending() are tracked too; in the event path allocation time is
+not separated and counts as render_ns.
+"""
+
+import sys
+import weakref
+from collections import deque
+from collections.abc import Container
+from dataclasses import dataclass, fields, replace
+from itertools import count
+from time import perf_counter_ns
+
+sys.path.insert(0, __file__.rsplit("/", 2)[0])
+from runtime.cs1_alloc import label
+from runtime.cs1_scanner import CitationScanner
+from runtime.cs1_stream import Citation, CitationRegistry, StreamingRenumberer, StreamParser, TextSpan
+
+# Fields merged by maximum rather than by sum.
+_MAX_FIELDS = frozenset({"max_pending", "max_delay_ns"})
+
+
+@dataclass
+class StreamStats:
+    """Profiling counters for one stream, or an aggregate of several."""
+
+    streams: int = 1
+    tokens: int = 0
+    scan_ns: int = 0
+    alloc_ns: int = 0
+    render_ns: int = 0
+    citations: int = 0
+    distinct_sources: int = 0
+    max_pending: int = 0
+    delayed_chars: int = 0
+    delay_ns: int = 0
+    max_delay_ns: int = 0
+
+    @property
+    def mean_delay_ns(self) -> float:
+        """Mean wait of a delayed character."""
+        return self.delay_ns / self.delayed_chars if self.delayed_chars else 0.0
+
+    def merge(self, other: "StreamStats") -> "StreamStats":
+        """Return the aggregate of self and other."""
+        values = {}
+        for f in fields(self):
+            a, b = getattr(self, f.name), getattr(other, f.name)
+            values[f.name] = max(a, b) if f.name in _MAX_FIELDS else a + b
+        return StreamStats(**values)
+
+
+class StatsCollector:
+    """Aggregates the stats of every renumberer created with it."""
+
+    def __init__(self) -> None:
+        self._finished = StreamStats(streams=0)
+        self._live: dict[int, StreamStats] = {}
+        self._keys = count()
+
+    def __len__(self) -> int:
+        """Number of live streams."""
+        return len(self._live)
+
+    def register(self, stats: StreamStats) -> int:
+        """Track a live stream's stats; returns the key to finish() it with."""
+        key = next(self._keys)
+        self._live[key] = stats
+        return key
+
+    def finish(self, key: int) -> None:
+        """Fold a stream's stats into the running total and forget it."""
+        stats = self._live.pop(key, None)
+        if stats is not None:
+            self._finished = self._finished.merge(stats)
+
+    def snapshot(self) -> StreamStats:
+        """Return the aggregate over all finished and live streams."""
+        total = self._finished
+        for stats in list(self._live.values()):
+            total = total.merge(stats)
+        return total
+
+
+class InstrumentedRenumberer(StreamingRenumberer):
+    """StreamingRenumberer that profiles its own stream."""
+
+    def __init__(
+        self,
+        source_catalog: Container[str] | None = None,
+        parser: StreamParser | CitationScanner | None = None,
+        collector: StatsCollector | None = None,
+    ) -> None:
+        super().__init__(source_catalog=source_catalog, parser=parser)
+        self._collector = collector
+        self._done: weakref.finalize | None = None
+        self._start_stats()
+
+    def _start_stats(self) -> None:
+        self._stats = StreamStats()
+        # Held-back characters as [arrival_ns, count], oldest first.
+        self._arrivals: deque[list[int]] = deque()
+        self._held = 0
+        collector = self._collector
+        if collector is not None:
+            key = collector.register(self._stats)
+            self._done = weakref.finalize(self, collector.finish, key)
+
+    def stats(self) -> StreamStats:
+        """Return a snapshot of this stream's counters."""
+        return replace(self._stats)
+
+    def reset(self, registry: CitationRegistry | None = None) -> None:
+        """Finish this stream's stats and start a new stream."""
+        super().reset(registry)
+        if self._done is not None:
+            self._done()
+        self._start_stats()
+
+    def process_token(self, token: str) -> str:
+        stats = self._stats
+        start = perf_counter_ns()
+        self._token_offset += 1
+        events = self._parser.feed(token)
+        scanned = perf_counter_ns()
+        text = self._render(events)
+        rendered = perf_counter_ns()
+        stats.tokens += 1
+        stats.scan_ns += scanned - start
+        stats.render_ns += rendered - scanned
+        self._track_pending(start, len(token))
+        return text
+
+    def process_token_events(self, token: str) -> list[TextSpan | Citation]:
+        stats = self._stats
+        start = perf_counter_ns()
+        self._token_offset += 1
+        held = self._parser.pending
+        parsed = self._parser.feed(token)
+        scanned = perf_counter_ns()
+        events = self._structure(parsed, held, token)
+        stats.tokens += 1
+        stats.scan_ns += scanned - start
+        stats.render_ns += perf_counter_ns() - scanned
+        self._count_citations(events)
+        self._track_pending(start, len(token))
+        return events
+
+    def flush_events(self) -> list[TextSpan | Citation]:
+        start = perf_counter_ns()
+        events = super().flush_events()
+        self._stats.render_ns += perf_counter_ns() - start
+        self._count_citations(events)
+        self._track_pending(start, 0)
+        return events
+
+    def release_pending(self) -> str:
+        start = perf_counter_ns()
+        text = super().release_pending()
+        self._track_pending(start, 0)
+        return text
+
+    def _count_citations(self, events: list[TextSpan | Citation]) -> None:
+        stats = self._stats
+        for event in events:
+            if type(event) is Citation:
+                stats.citations += 1
+        stats.distinct_sources = self._registry.version
+
+    def _settle(self) -> None:
+        start = perf_counter_ns()
+        events = self._parser.flush()
+        scanned = perf_counter_ns()
+        if events:
+            self._tail += self._render(events)
+        self._stats.scan_ns += scanned - start
+        self._stats.render_ns += perf_counter_ns() - scanned
+        self._track_pending(start, 0)
+
+    def _render(self, events: list[tuple[str, str]]) -> str:
+        stats = self._stats
+        registry = self._registry
+        resolve_num = registry.resolve_num
+        parts: list[str] = []
+        for kind, value in events:
+            if kind == "text":
+                parts.append(value)
+            elif kind == "cite":
+                stats.citations += 1
+                start = perf_counter_ns()
+                num = resolve_num(value)
+                elapsed = perf_counter_ns() - start
+                stats.alloc_ns += elapsed
+                # render_ns is measured around _render; keep it exclusive.
+                stats.render_ns -= elapsed
+                stats.distinct_sources = registry.version
+                if num is None:
+                    parts.append("[?]")
+                else:
+                    self._finalizer.observe(num)
+                    parts.append(label(num))
+        return "".join(parts)
+
+    def _track_pending(self, now: int, arrived: int) -> None:
+        """Account for characters entering and leaving the held-back buffer.
+
+        The buffer is always a suffix of the input, so characters leave it in
+        arrival order.
+        """
+        stats = self._stats
+        arrivals = self._arrivals
+        if arrived:
+            arrivals.append([now, arrived])
+        pending = len(self._parser.pending)
+        released = self._held + arrived - pending
+        self._held = pending
+        if pending > stats.max_pending:
+            stats.max_pending = pending
+        while released:
+            entry = arrivals[0]
+            n = min(released, entry[1])
+            if entry[0] != now:
+                waited = now - entry[0]
+                stats.delayed_chars += n
+                stats.delay_ns += n * waited
+                if waited > stats.max_delay_ns:
+                    stats.max_delay_ns = waited
+            released -= n
+            if n == entry[1]:
+                arrivals.popleft()
+            else:
+                entry[1] -= n
@@ -0,0 +1,620 @@
+"""Split-boundary-aware CS1 renumbering components.
+
+Promoted from implementations/cs1/cs1-conventional-run4.py, which stays
+frozen as an experiment output. The three-component decomposition is kept:
+
+    StreamParser      : incremental source_N parser that holds back a tail
+                        which could still grow into a citation.
+    CitationRegistry  : append-only source_id -> display number map.
+    Finalizer         : consistency check of rendered numbers against the
+                        registry, tracked incrementally during rendering.
+
+StreamingRenumberer combines them behind process_token / get_source_list.
+It parses with the incremental CitationScanner (runtime/cs1_scanner.py) by
+default; StreamParser remains as the regex-based equivalent.
+Differences from the run 4 original:
+  - flush() resolves complete citations left in the held-back buffer
+    (e.g. a stream ending in "source_12") instead of emitting them raw.
+  - Text flushed at end of stream is returned by StreamingRenumberer.flush()
+    rather than being dropped by get_source_list().
+  - The Finalizer records display numbers as they are rendered instead of
+    re-scanning the joined output for [n], so no emitted text is retained
+    and finalization is O(number of citations).
+
+process_token_events() is the structured alternative to process_token():
+instead of a rendered string it returns TextSpan events, which locate each
+piece of text as offsets into the token (or into held-back text from an
+earlier token) without copying it, and Citation events carrying both the
+display number and the source id. A renderer building link nodes from
+them never has to re-scan "[k]" in the output.
+
+ByteStreamingRenumberer adds process_chunk() for raw UTF-8 chunks, e.g. SSE
+data read from a socket, without decoding or re-encoding the text.
+"""
+
+import re
+import sys
+from collections.abc import Container
+from typing import NamedTuple
+
+sys.path.insert(0, __file__.rsplit("/", 2)[0])
+from runtime.cs1_alloc import label
+from runtime.cs1_checkpoint import (
+    PARSER_BYTE_SCANNER,
+    PARSER_REGEX,
+    PARSER_SCANNER,
+    CheckpointState,
+    decode_checkpoint,
+    encode_checkpoint,
+)
+from runtime.cs1_scanner import ByteCitationScanner, CitationScanner
+
+
+class StreamParser:
+    """
+    Stateful incremental parser for source_N patterns.
+
+    A tail that could begin a citation ("s", "sour", "source_", "source_12")
+    is held back until the next token decides whether it is one.
+    """
+
+    _SOURCE_RE = re.compile(r'source_\d+')
+    _PARTIAL_RE = re.compile(r's(?:o(?:u(?:r(?:c(?:e(?:_\d*)?)?)?)?)?)?$')
+
+    def __init__(self) -> None:
+        self._buf: str = ""
+
+    @property
+    def pending(self) -> str:
+        """Text currently held back."""
+        return self._buf
+
+    def snapshot(self) -> tuple[int, str]:
+        """Return (state, pending) for checkpointing; state is always 0."""
+        return 0, self._buf
+
+    def restore(self, state: int, pending: str) -> None:
+        """Resume from a snapshot() taken earlier."""
+        self._buf = pending
+
+    def feed(self, token: str) -> list[tuple[str, str]]:
+        """
+        Feed a token; return list of (kind, value) pairs where:
+          - ('text', s)      — literal text safe to emit
+          - ('cite', id)     — a complete citation with given source id
+        """
+        text = self._buf + token
+
+        # Find where a partial source_N could start at the tail
+        pm = self._PARTIAL_RE.search(text)
+        if pm:
+            self._buf = text[pm.start():]
+            text = text[:pm.start()]
+        else:
+            self._buf = ""
+        return self._split(text)
+
+    def release(self) -> list[tuple[str, str]]:
+        """Give up a held-back prefix that has no digits yet, as text.
+
+        See CitationScanner.release().
+        """
+        buf = self._buf
+        if not buf or buf[-1].isdigit():
+            return []
+        self._buf = ""
+        return [("text", buf)]
+
+    def flush(self) -> list[tuple[str, str]]:
+        """Flush the held-back buffer (call at stream end).
+
+        Complete citations in the buffer are still reported as 'cite'
+        events; only an unfinished prefix such as "sour" becomes text.
+        """
+        remaining = self._buf
+        self._buf = ""
+        return self._split(remaining)
+
+    def _split(self, text: str) -> list[tuple[str, str]]:
+        events: list[tuple[str, str]] = []
+        pos = 0
+        for match in self._SOURCE_RE.finditer(text):
+            before = text[pos:match.start()]
+            if before:
+                events.append(("text", before))
+            events.append(("cite", match.group(0)))
+            pos = match.end()
+
+        tail = text[pos:]
+        if tail:
+            events.append(("text", tail))
+        return events
+
+
+class CitationRegistry:
+    """
+    Append-only registry: source_id -> display number.
+
+    Invariants:
+      1. id_to_num written once, never changed
+      2. next_num monotonically increasing
+    """
+
+    def __init__(self, source_catalog: Container[str] | None = None) -> None:
+        # Optional catalog of known source IDs (Source Catalog component):
+        # a set, or a SourceCatalogIndex shared between streams.
+        self._catalog: Container[str] | None = source_catalog
+        # Invariant 1: written once
+        self._id_to_num: dict[str, int] = {}
+        # Ordered for list generation
+        self._ordered: list[tuple[int, str]] = []
+        # Invariant 2: monotonically increasing
+        self._next_num: int = 1
+        # Monitoring log for invalid IDs
+        self._invalid_log: list[str] = []
+
+    @classmethod
+    def from_ordered(
+        cls, source_ids: list[str], source_catalog: Container[str] | None = None
+    ) -> "CitationRegistry":
+        """Rebuild a registry whose k-th registered id is source_ids[k - 1]."""
+        registry = cls(source_catalog=source_catalog)
+        registry._ordered = list(enumerate(source_ids, 1))
+        registry._id_to_num = {sid: num for num, sid in registry._ordered}
+        registry._next_num = len(source_ids) + 1
+        return registry
+
+    @property
+    def source_catalog(self) -> Container[str] | None:
+        """Catalog of known source ids, or None if every id is accepted."""
+        return self._catalog
+
+    def resolve(self, source_id: str) -> str:
+        """
+        Resolve source_id to display string.
+
+        Returns "[n]" for valid IDs (registered on first call),
+        "[?]" for IDs not in the source catalog, with a log entry.
+        """
+        num = self.resolve_num(source_id)
+        return "[?]" if num is None else label(num)
+
+    def resolve_num(self, source_id: str) -> int | None:
+        """Like resolve(), but return the display number (None if invalid)."""
+        if self._catalog is not None and source_id not in self._catalog:
+            self._invalid_log.append(source_id)
+            return None
+
+        num = self._id_to_num.get(source_id)
+        if num is None:
+            # Invariant 1 + 2: assign once, increment monotonically
+            num = self._next_num
+            self._next_num += 1
+            self._id_to_num[source_id] = num
+            self._ordered.append((num, source_id))
+        return num
+
+    def get_ordered(self) -> list[tuple[int, str]]:
+        """Return [(num, source_id), ...] in registration order."""
+        return list(self._ordered)
+
+    def clear(self) -> None:
+        """Forget every registration, e.g. before reusing the registry."""
+        self._id_to_num.clear()
+        self._ordered.clear()
+        self._next_num = 1
+        self._invalid_log.clear()
+
+    @property
+    def version(self) -> int:
+        """Number of registered sources, i.e. the highest display number."""
+        return len(self._ordered)
+
+    def get_ordered_since(self, version: int) -> list[tuple[int, str]]:
+        """Return the entries registered after version, in O(delta)."""
+        return self._ordered[version:]
+
+    @property
+    def invalid_log(self) -> list[str]:
+        return list(self._invalid_log)
+
+
+class Finalizer:
+    """
+    Stream consistency checker.
+
+    Verifies that every display number rendered into the output has a
+    corresponding entry in the registry (Invariant 3: list generated from
+    map). Numbers are observed as they are rendered, so memory is bounded by
+    the number of distinct citations rather than the response length.
+    """
+
+    __slots__ = ("_referenced",)
+
+    def __init__(self) -> None:
+        self._referenced: set[int] = set()
+
+    def clear(self) -> None:
+        self._referenced.clear()
+
+    def observe(self, num: int) -> None:
+        """Record a display number rendered into the output."""
+        self._referenced.add(num)
+
+    def check(self, source_list: list[tuple[int, str]]) -> list[str]:
+        """
+        Return list of error strings. Empty list means consistent.
+        """
+        registered_nums = {num for num, _ in source_list}
+        return [
+            f"[{num}] referenced in text but not in source list"
+            for num in sorted(self._referenced - registered_nums)
+        ]
+
+
+class TextSpan(NamedTuple):
+    """Literal text: source[start:end], where source is a token passed to
+    process_token_events() or text held back from an earlier token."""
+
+    source: str
+    start: int
+    end: int
+
+    @property
+    def text(self) -> str:
+        return self.source[self.start:self.end]
+
+
+class Citation(NamedTuple):
+    """A citation; num is None for an id rejected by the source catalog."""
+
+    num: int | None
+    source_id: str
+
+    @property
+    def text(self) -> str:
+        return "[?]" if self.num is None else label(self.num)
+
+
+def render_events(events: list[TextSpan | Citation]) -> str:
+    """Render structured events to the string process_token() would return."""
+    return "".join(event.text for event in events)
+
+
+class StreamingRenumberer:
+    """
+    Public facade combining a parser + CitationRegistry + Finalizer.
+
+    process_token may return less text than it was given while a possible
+    citation prefix is held back; flush() returns whatever is still pending
+    once the stream has ended.
+    """
+
+    def __init__(
+        self,
+        source_catalog: Container[str] | None = None,
+        parser: StreamParser | CitationScanner | None = None,
+        registry: CitationRegistry | None = None,
+    ) -> None:
+        """
+        Args:
+            source_catalog: Known source ids; others render as "[?]".
+            parser: Parser instance; a CitationScanner by default.
+            registry: Registry to number into, e.g. a SharedCitationRegistry
+                      shared by parallel candidate answers. It carries its
+                      own catalog, so source_catalog must then be omitted.
+        """
+        if registry is not None and source_catalog is not None:
+            raise ValueError("pass source_catalog to the registry, not to the renumberer")
+        self._parser = parser if parser is not None else CitationScanner()
+        self._registry = registry if registry is not None else CitationRegistry(source_catalog=source_catalog)
+        self._owns_registry = registry is None
+        self._finalizer = Finalizer()
+        self._tail: str = ""  # flushed at finalization but not yet returned
+        self._token_offset: int = 0  # tokens processed, for checkpoint/resume
+        self.errors: list[str] = []
+
+    @property
+    def registry(self) -> CitationRegistry:
+        return self._registry
+
+    @property
+    def token_offset(self) -> int:
+        """Number of tokens processed; replay resumes from this index."""
+        return self._token_offset
+
+    def process_token(self, token: str) -> str:
+        """Process one streaming token; return displayable text."""
+        self._token_offset += 1
+        return self._render(self._parser.feed(token))
+
+    def reset(self, registry: CitationRegistry | None = None) -> None:
+        """Return to the initial state so a pooled instance can serve a new stream.
+
+        Args:
+            registry: Registry for the new stream to number into. Without one,
+                      a private registry is cleared for reuse, while an
+                      injected registry is shared with other streams and is
+                      left alone: the renumberer detaches from it and
+                      continues with a new private registry over the same
+                      source_catalog. Pass the shared registry again to stay
+                      attached.
+        """
+        self._parser.restore(0, self._parser.pending[:0])
+        if registry is not None:
+            self._registry = registry
+            self._owns_registry = False
+        elif self._owns_registry:
+            self._registry.clear()
+        else:
+            self._registry = CitationRegistry(source_catalog=self._registry.source_catalog)
+            self._owns_registry = True
+        self._finalizer.clear()
+        self._tail = self._tail[:0]
+        self._token_offset = 0
+        self.errors = []
+
+    def process_token_events(self, token: str) -> list[TextSpan | Citation]:
+        """Process one streaming token; return structured events."""
+        self._token_offset += 1
+        held = self._parser.pending
+        return self._structure(self._parser.feed(token), held, token)
+
+    def flush_events(self) -> list[TextSpan | Citation]:
+        """Structured counterpart of flush(), for process_token_events() callers.
+
+        Call it before get_source_list(), which flushes held-back text into
+        the plain-text tail; such a tail is returned as one TextSpan.
+        """
+        held = self._parser.pending
+        events = self._structure(self._parser.flush(), held, held[:0])
+        tail, self._tail = self._tail, self._tail[:0]
+        if tail:
+            events.insert(0, TextSpan(tail, 0, len(tail)))
+        return events
+
+    def _structure(self, events: list[tuple[str, str]], held: str, token: str) -> list[TextSpan | Citation]:
+        """Turn parser events into spans of held + token.
+
+        Parser events cover held + token in order, so each text event is
+        located by the running offset; one may straddle the two.
+        """
+        out: list[TextSpan | Citation] = []
+        held_len = len(held)
+        pos = 0
+        for kind, value in events:
+            end = pos + len(value)
+            if kind == "text":
+                if pos < held_len:
+                    out.append(TextSpan(held, pos, min(end, held_len)))
+                if end > held_len:
+                    out.append(TextSpan(token, max(pos, held_len) - held_len, end - held_len))
+            elif kind == "cite":
+                num = self._registry.resolve_num(value)
+                if num is not None:
+                    self._finalizer.observe(num)
+                out.append(Citation(num, value))
+            pos = end
+        return out
+
+    def checkpoint(self) -> bytes:
+        """
+        Serialize the stream state (see runtime/cs1_checkpoint.py).
+
+        Restoring with from_checkpoint() and feeding the tokens from
+        token_offset onwards reproduces the output of the original stream.
+        """
+        parser = self._parser
+        if isinstance(parser, ByteCitationScanner):
+            kind = PARSER_BYTE_SCANNER
+        elif isinstance(parser, CitationScanner):
+            kind = PARSER_SCANNER
+        else:
+            kind = PARSER_REGEX
+        scan_state, pending = parser.snapshot()
+        tail = self._tail
+        return encode_checkpoint(CheckpointState(
+            parser_kind=kind,
+            hold=kind == PARSER_REGEX or parser.hold,
+            scan_state=scan_state,
+            token_offset=self._token_offset,
+            pending=pending if isinstance(pending, bytes) else pending.encode(),
+            tail=tail if isinstance(tail, bytes) else tail.encode(),
+            source_ids=[sid for _, sid in self._registry.get_ordered()],
+            max_digits=None if kind == PARSER_REGEX else parser.max_digits,
+        ))
+
+    @classmethod
+    def from_checkpoint(
+        cls,
+        data: bytes,
+        source_catalog: Container[str] | None = None,
+        max_digits: int | None = None,
+        registry: CitationRegistry | None = None,
+    ) -> "StreamingRenumberer":
+        """Restore a renumberer from checkpoint() output in O(state).
+
+        The scanner's max_digits is restored from the checkpoint. Passing
+        max_digits checks it against the stored value instead.
+
+        A stream that numbered into an injected (e.g. shared) registry keeps
+        doing so only if that registry is passed again; otherwise it resumes
+        with a private registry rebuilt from the checkpoint. The registry
+        must still start with the numbering recorded in the checkpoint.
+
+        Raises:
+            ValueError: If the checkpoint is malformed, was taken in the other
+                        text mode, max_digits differs from the stored one, or
+                        registry does not extend the stored numbering.
+        """
+        state = decode_checkpoint(data)
+        if (state.parser_kind == PARSER_BYTE_SCANNER) != issubclass(cls, ByteStreamingRenumberer):
+            raise ValueError(f"checkpoint parser kind {state.parser_kind} does not match {cls.__name__}")
+        if max_digits is not None and max_digits != state.max_digits:
+            raise ValueError(f"checkpoint has max_digits={state.max_digits}, not {max_digits}")
+        max_digits = state.max_digits
+
+        if state.parser_kind == PARSER_BYTE_SCANNER:
+            parser = ByteCitationScanner(hold=state.hold, max_digits=max_digits)
+            parser.restore(state.scan_state, state.pending)
+            tail = state.tail
+        else:
+            if state.parser_kind == PARSER_REGEX:
+                parser = StreamParser()
+            else:
+                parser = CitationScanner(hold=state.hold, max_digits=max_digits)
+            parser.restore(state.scan_state, state.pending.decode())
+            tail = state.tail.decode()
+
+        if registry is not None:
+            stored = list(enumerate(state.source_ids, 1))
+            if registry.get_ordered()[:len(stored)] != stored:
+                raise ValueError("registry does not match the checkpoint's numbering")
+            renumberer = cls(source_catalog=source_catalog, parser=parser, registry=registry)
+        else:
+            renumberer = cls(source_catalog=source_catalog, parser=parser)
+            renumberer._registry = CitationRegistry.from_ordered(state.source_ids, source_catalog)
+        renumberer._tail = tail
+        renumberer._token_offset = state.token_offset
+        return renumberer
+
+    @property
+    def held_back(self) -> str:
+        """Text the parser is currently holding back."""
+        return self._parser.pending
+
+    def release_pending(self) -> str:
+        """
+        Emit a held-back citation prefix as literal text before the stream ends.
+
+        Only a prefix without digits ("sour", "source_") is released: it has
+        no display number yet, so emitting it cannot change a number already
+        shown. If the next token would have completed the citation, that
+        citation stays literal text. A held-back digit run ("source_12") is
+        kept, since its id may still grow. Returns "" if nothing was released.
+        """
+        return self._render(self._parser.release())
+
+    def flush(self) -> str:
+        """Return the held-back text, rendered, at end of stream."""
+        self._settle()
+        tail, self._tail = self._tail, ""
+        return tail
+
+    @property
+    def source_list_version(self) -> int:
+        """Version of the source list; grows by one per allocated number."""
+        return self._registry.version
+
+    def get_source_list_since(self, version: int) -> list[tuple[int, str]]:
+        """
+        Return only the (num, source_id) pairs allocated after version.
+
+        Intended for polling during streaming: pass the version returned by
+        the previous poll (0 initially). The cost is O(new entries) and does
+        not depend on how many citations the answer already contains. Unlike
+        get_source_list() this does not flush held-back text.
+        """
+        return self._registry.get_ordered_since(version)
+
+    def get_source_list(self) -> list[tuple[int, str]]:
+        """
+        Finalize the stream and return the source list.
+
+        The list is generated exclusively from the registry. Held-back text
+        is flushed first so that a trailing citation is registered; that text
+        remains available from flush().
+        """
+        self._settle()
+        source_list = self._registry.get_ordered()
+        # Finalizer consistency check (errors recorded, never raised)
+        self.errors = self._finalizer.check(source_list)
+        return source_list
+
+    def _settle(self) -> None:
+        events = self._parser.flush()
+        if events:
+            self._tail += self._render(events)
+
+    def _render(self, events: list[tuple[str, str]]) -> str:
+        parts: list[str] = []
+        for kind, value in events:
+            if kind == "text":
+                parts.append(value)
+            elif kind == "cite":
+                num = self._registry.resolve_num(value)
+                if num is None:
+                    parts.append("[?]")
+                else:
+                    self._finalizer.observe(num)
+                    parts.append(label(num))
+        return "".join(parts)
+
+
+class ByteStreamingRenumberer(StreamingRenumberer):
+    """
+    StreamingRenumberer over raw UTF-8 chunks.
+
+    process_chunk scans bytes directly with ByteCitationScanner. Text spans
+    are only copied once, into the returned bytes; a chunk without
+    citations or held-back text is returned as-is when it is a bytes object.
+    """
+
+    def __init__(
+        self,
+        source_catalog: Container[str] | None = None,
+        parser: ByteCitationScanner | None = None,
+        registry: CitationRegistry | None = None,
+    ) -> None:
+        super().__init__(
+            source_catalog=source_catalog,
+            parser=parser if parser is not None else ByteCitationScanner(),
+            registry=registry,
+        )
+        self._tail: bytes = b""
+
+    def process_chunk(self, chunk: bytes | memoryview) -> bytes:
+        """Process one raw UTF-8 chunk; return displayable bytes."""
+        self._token_offset += 1
+        events = self._parser.feed(chunk)
+        if (
+            type(chunk) is bytes
+            and len(events) == 1
+            and events[0][0] == "text"
+            and len(events[0][1]) == len(chunk)
+        ):
+            # Nothing rewritten or held back: pass the chunk through uncopied.
+            return chunk
+        return self._render(events)
+
+    def process_token(self, token: str) -> str:
+        """str interface for callers that have already decoded the text."""
+        return self.process_chunk(token.encode()).decode()
+
+    def release_pending(self) -> bytes:
+        """Bytes counterpart of StreamingRenumberer.release_pending().
+
+        Emits a held-back citation prefix without digits as literal bytes;
+        returns b"" if nothing was released.
+        """
+        return self._render(self._parser.release())
+
+    def flush(self) -> bytes:
+        """Return the held-back bytes, rendered, at end of stream."""
+        self._settle()
+        tail, self._tail = self._tail, b""
+        return tail
+
+    def _render(self, events: list[tuple[str, bytes | memoryview]]) -> bytes:
+        parts: list[bytes | memoryview] = []
+        for kind, value in events:
+            if kind == "text":
+                parts.append(value)
+            elif kind == "cite":
+                num = self._registry.resolve_num(str(value, "ascii"))
+                if num is None:
+                    parts.append(b"[?]")
+                else:
+                    self._finalizer.observe(num)
+                    parts.append(b"[%d]" % num)
+        return b"".join(parts)
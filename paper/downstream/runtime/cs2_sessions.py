@@ -0,0 +1,83 @@
+"""Session store with a per-user index for O(k) admin revocation.
+
+ReferenceSessionManager keeps one token -> session dict, so revoking a
+user's sessions scans every session of every tenant. IndexedSessionManager
+keeps a secondary index alongside it,
+
+    _by_user: (tenant_id, user_id) -> set of that user's tokens
+
+which create_session() adds to and invalidate_session() removes from (the
+entry is dropped with the user's last session). Each token's index key is
+kept in a third map, _owner, rather than read back from the session dict:
+validate_session() hands that dict to callers, and a caller modifying it
+must not be able to desync the index. invalidate_user_sessions()
+then pops the user's entry and deletes exactly those tokens: O(k) in the
+user's own sessions, independent of the total. validate_session() is the
+same single dict lookup as before, and like the reference it returns the
+stored dict rather than a copy.
+
+Like the reference, the store is not locked; callers that share one
+instance between threads serialize access themselves.
+"""
+
+import secrets
+import sys
+
+sys.path.insert(0, __file__.rsplit("/", 2)[0])
+from interfaces.cs2_interface import SessionManager
+
+
+class IndexedSessionManager(SessionManager):
+    """In-memory sessions indexed by token and by (tenant_id, user_id)."""
+
+    def __init__(self) -> None:
+        self._sessions: dict[str, dict] = {}
+        self._by_user: dict[tuple[str, str], set[str]] = {}
+        self._owner: dict[str, tuple[str, str]] = {}
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def create_session(self, tenant_id: str, user_id: str, device_id: str) -> str:
+        token = secrets.token_hex(32)
+        self._sessions[token] = {
+            "tenant_id": tenant_id,
+            "user_id": user_id,
+            "device_id": device_id,
+        }
+        key = (tenant_id, user_id)
+        tokens = self._by_user.get(key)
+        if tokens is None:
+            tokens = self._by_user[key] = set()
+        tokens.add(token)
+        self._owner[token] = key
+        return token
+
+    def validate_session(self, token: str) -> dict | None:
+        """Return the stored session dict (not a copy; the index does not read it)."""
+        return self._sessions.get(token)
+
+    def user_session_count(self, tenant_id: str, user_id: str) -> int:
+        tokens = self._by_user.get((tenant_id, user_id))
+        return len(tokens) if tokens is not None else 0
+
+    def invalidate_user_sessions(self, tenant_id: str, user_id: str) -> int:
+        tokens = self._by_user.pop((tenant_id, user_id), None)
+        if tokens is None:
+            return 0
+        sessions, owner = self._sessions, self._owner
+        for token in tokens:
+            del sessions[token]
+            del owner[token]
+        return len(tokens)
+
+    def invalidate_session(self, token: str) -> bool:
+        key = self._owner.pop(token, None)
+        if key is None:
+            return False
+        del self._sessions[token]
+        tokens = self._by_user[key]
+        tokens.discard(token)
+        if not tokens:
+            del self._by_user[key]
+        return True
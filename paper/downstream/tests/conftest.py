@@ -13,6 +13,8 @@ import pytest
 # Add parent directories to path for interface imports
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "interfaces"))
+# Benchmark helpers (trace format) import each other as top-level modules.
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "benchmarks"))
 
 
 @pytest.fixture
@@ -0,0 +1,1199 @@
+"""Tests for the CS1 runtime components under paper/downstream/runtime/.
+
+Unlike test_cs1.py these do not load an implementation from
+DOWNSTREAM_IMPL_PATH; each runtime component is exercised directly and,
+where it shares its semantics, compared with ReferenceCitationRenumberer.
+"""
+
+import asyncio
+import io
+import json
+import random
+import re
+import threading
+
+import pytest
+
+from cs1_traces import TraceRecorder, TraceToken, load_trace, save_trace
+from reference_cs1 import ReferenceCitationRenumberer
+from runtime.cs1_alloc import FastCitationRenumberer, label
+from runtime.cs1_asgi import CitationRenumberMiddleware
+from runtime.cs1_async import AsyncCitationStream
+from runtime.cs1_bulk import record_chunks, renumber_jsonl
+from runtime.cs1_catalog import SourceCatalogIndex
+from runtime.cs1_checkpoint import CheckpointCache, CheckpointState, decode_checkpoint, encode_checkpoint
+from runtime.cs1_grammar import (
+    DEFAULT_GRAMMAR,
+    CitationPattern,
+    GrammarRenumberer,
+    compile_grammar,
+)
+from runtime.cs1_metadata import MetadataPrefetcher
+from runtime.cs1_multistream import MultiStreamRenumberer
+from runtime.cs1_scanner import CitationScanner
+from runtime.cs1_service import TEXT, RenumberingService, ServiceClient, ServiceError, shard_of
+from runtime.cs1_shared import SharedCitationRegistry
+from runtime.cs1_stats import InstrumentedRenumberer, StatsCollector
+from runtime.cs1_stream import (
+    ByteStreamingRenumberer,
+    Citation,
+    Finalizer,
+    StreamingRenumberer,
+    StreamParser,
+    TextSpan,
+    render_events,
+)
+
+
+def _reference_run(tokens):
+    ref = ReferenceCitationRenumberer()
+    out = [ref.process_token(t) for t in tokens]
+    return out, ref.get_source_list()
+
+
+class TestMultiStreamRenumberer:
+    """Multiplexed streams keep the reference semantics per stream."""
+
+    def test_interleaved_streams_match_reference(self):
+        streams = {
+            "a": ["See source_3.", " Also source_7 and source_3.", " done"],
+            "b": ["source_7 first", ", then source_1", " and source_7"],
+            "c": ["no citations at all"],
+        }
+        engine = MultiStreamRenumberer()
+        outputs = {sid: [] for sid in streams}
+        for i in range(3):
+            for sid, tokens in streams.items():
+                if i < len(tokens):
+                    outputs[sid].append(engine.process_token(sid, tokens[i]))
+
+        for sid, tokens in streams.items():
+            expected_out, expected_sources = _reference_run(tokens)
+            assert outputs[sid] == expected_out
+            assert engine.get_source_list(sid) == expected_sources
+
+    def test_leading_zero_ids_stay_distinct(self):
+        tokens = ["source_7 source_007 source_07 source_7 source_0 source_\u0667"]
+        engine = MultiStreamRenumberer()
+        out = [engine.process_token("s", t) for t in tokens]
+        assert (out, engine.get_source_list("s")) == _reference_run(tokens)
+
+    def test_many_distinct_sources_switch_to_index(self):
+        tokens = [f"source_{n} " for n in range(100, 0, -1)] + ["source_50 source_100"]
+        engine = MultiStreamRenumberer()
+        out = [engine.process_token("s", t) for t in tokens]
+        assert (out, engine.get_source_list("s")) == _reference_run(tokens)
+
+    def test_close_returns_sources_and_recycles_state(self):
+        engine = MultiStreamRenumberer()
+        engine.process_token("a", "source_5 source_2")
+        assert engine.close("a") == [(1, "source_5"), (2, "source_2")]
+        assert "a" not in engine
+        assert len(engine) == 0
+
+        # A new stream reuses the recycled state without inheriting numbers.
+        assert engine.process_token("b", "source_2") == "[1]"
+        assert engine.get_source_list("b") == [(1, "source_2")]
+
+    def test_source_list_since_returns_delta(self):
+        engine = MultiStreamRenumberer()
+        engine.process_token("s", "source_4 source_2")
+        assert engine.get_source_list_since("s", 0) == [(1, "source_4"), (2, "source_2")]
+        engine.process_token("s", "source_2 source_9")
+        assert engine.get_source_list_since("s", 2) == [(3, "source_9")]
+        assert engine.source_list_version("s") == 3
+        assert engine.get_source_list_since("s", 3) == []
+
+    def test_stream_handle_implements_interface(self):
+        engine = MultiStreamRenumberer()
+        handle = engine.stream("h")
+        assert handle.process_token("source_9 and source_4") == "[1] and [2]"
+        assert handle.get_source_list() == [(1, "source_9"), (2, "source_4")]
+        assert handle.close() == [(1, "source_9"), (2, "source_4")]
+        assert engine.get_source_list("h") == []
+
+
+class TestStreamingRenumberer:
+    """Split-boundary-aware renumbering holds back and flushes correctly."""
+
+    def test_citation_split_across_tokens(self):
+        r = StreamingRenumberer()
+        out = [r.process_token(t) for t in ["See sou", "rce_1", "2 and source_", "3."]]
+        out.append(r.flush())
+        assert "".join(out) == "See [1] and [2]."
+        assert r.get_source_list() == [(1, "source_12"), (2, "source_3")]
+
+    def test_trailing_citation_is_resolved_at_flush(self):
+        r = StreamingRenumberer()
+        assert r.process_token("ends with source_12") == "ends with "
+        assert r.flush() == "[1]"
+        assert r.get_source_list() == [(1, "source_12")]
+
+    def test_source_list_since_polls_only_new_entries(self):
+        r = StreamingRenumberer()
+        version = r.source_list_version
+        assert version == 0
+        r.process_token("source_5 and source_8 ")
+        delta = r.get_source_list_since(version)
+        assert delta == [(1, "source_5"), (2, "source_8")]
+        version = r.source_list_version
+        r.process_token("source_5 again, then source_1 ")
+        assert r.get_source_list_since(version) == [(3, "source_1")]
+        assert r.get_source_list_since(r.source_list_version) == []
+
+    def test_get_source_list_keeps_flushed_text(self):
+        r = StreamingRenumberer()
+        r.process_token("tail source_4")
+        assert r.get_source_list() == [(1, "source_4")]
+        assert r.flush() == "[1]"
+        assert r.flush() == ""
+        assert r.errors == []
+
+
+def _random_split(text, rng, max_cuts=6):
+    cuts = sorted(rng.sample(range(len(text) + 1), min(len(text) + 1, rng.randint(0, max_cuts))))
+    bounds = [0] + cuts + [len(text)]
+    return [text[a:b] for a, b in zip(bounds, bounds[1:])]
+
+
+def _merged(events):
+    """Join adjacent text events so that parsers can be compared."""
+    out = []
+    for kind, value in events:
+        if kind == "text" and out and out[-1][0] == "text":
+            out[-1] = ("text", out[-1][1] + value)
+        else:
+            out.append((kind, value))
+    return out
+
+
+def _regex_events(text, max_digits=None):
+    events, pos = [], 0
+    for m in re.finditer(r"source_\d+", text):
+        if max_digits is not None and len(m.group(0)) - len("source_") > max_digits:
+            continue
+        events.append(("text", text[pos:m.start()]))
+        events.append(("cite", m.group(0)))
+        pos = m.end()
+    events.append(("text", text[pos:]))
+    return _merged([e for e in events if e[1]])
+
+
+class TestFastCitationRenumberer:
+    """The integer fast path reproduces the reference output exactly."""
+
+    def test_random_streams_match_reference(self):
+        rng = random.Random(11)
+        ids = ["source_1", "source_7", "source_42", "source_007", "source_0", "source_4095",
+               "source_4096", "source_123456789", "source_\u0663", "source_3"]
+        for _ in range(300):
+            tokens = [
+                " ".join(rng.choice(ids + ["text", "sour", "ce_1"]) for _ in range(rng.randint(0, 5)))
+                for _ in range(rng.randint(1, 6))
+            ]
+            r = FastCitationRenumberer()
+            out = [r.process_token(t) for t in tokens]
+            assert (out, r.get_source_list()) == _reference_run(tokens)
+
+    def test_batches_match_per_token_processing(self):
+        rng = random.Random(13)
+        pieces = ["source_7", "source_007", " x ", "sour", "ce_3", "source_", "12", "\x00", ""]
+        for _ in range(300):
+            tokens = ["".join(rng.choice(pieces) for _ in range(rng.randint(0, 3)))
+                      for _ in range(rng.randint(0, 8))]
+            cut = rng.randint(0, len(tokens))
+            r = FastCitationRenumberer()
+            out = r.process_tokens(tokens[:cut]) + r.process_tokens(tokens[cut:])
+            assert (out, r.get_source_list()) == _reference_run(tokens)
+
+    def test_sinks_receive_reference_output(self):
+        tokens = ["See source_7", " and source_\u0663, ", "source_7 \u00e9 source_2", "sour", "ce_9", ""]
+        expected, sources = _reference_run(tokens)
+        text, pieces = io.StringIO(), []
+        for sink in (text, pieces.append):
+            r = FastCitationRenumberer()
+            feed = r.bind_sink(sink)
+            for token in tokens:
+                feed(token)
+            assert r.get_source_list() == sources
+        assert text.getvalue() == "".join(pieces) == "".join(expected)
+
+    def test_unsupported_sink_is_rejected(self):
+        with pytest.raises(TypeError):
+            FastCitationRenumberer().bind_sink(42)
+        with pytest.raises(TypeError):
+            FastCitationRenumberer().bind_sink(bytearray())
+
+    def test_labels_are_interned(self):
+        r = FastCitationRenumberer()
+        a = r.process_token("source_9")
+        b = r.process_token("source_9")
+        assert a is b is label(1)
+        assert label(5000) == "[5000]"
+
+
+class TestGrammarRenumberer:
+    """All marker styles share one first-appearance numbering."""
+
+    def test_mixed_markers_share_numbering(self):
+        r = GrammarRenumberer()
+        out = r.process_token("A source_3, B [doc:abc123], C 【4:0†notes】, again source_3 and [doc:abc123].")
+        assert out == "A [1], B [2], C [3], again [1] and [2]."
+        assert r.get_source_list() == [(1, "source_3"), (2, "doc:abc123"), (3, "ref:4")]
+
+    def test_source_only_stream_matches_reference(self):
+        tokens = ["See source_3.", " Also source_7 and source_3.", "source_007 none"]
+        r = GrammarRenumberer()
+        out = [r.process_token(t) for t in tokens]
+        assert (out, r.get_source_list()) == _reference_run(tokens)
+
+    def test_compiled_grammar_is_shared(self):
+        patterns = (CitationPattern("cite", r"<cite (?P<id>\w+)>"),)
+        grammar = compile_grammar(patterns)
+        assert compile_grammar(patterns) is grammar
+        assert compile_grammar(DEFAULT_GRAMMAR.patterns) is DEFAULT_GRAMMAR
+
+        r = GrammarRenumberer(grammar)
+        assert r.process_token("x <cite a1> y <cite b2> <cite a1> source_1") == "x [1] y [2] [1] source_1"
+        assert r.get_source_list() == [(1, "cite:a1"), (2, "cite:b2")]
+
+    def test_catalog_rejects_unknown_ids(self):
+        r = GrammarRenumberer(source_catalog={"doc:ok"})
+        assert r.process_token("[doc:ok] [doc:bad]") == "[1] [?]"
+
+    def test_id_backreference_follows_renamed_group(self):
+        patterns = (
+            CitationPattern("pair", r"<(?P<id>\w+)>(?P=id)</>"),
+            CitationPattern("tag", r"\{(?P<id>\d+)\}"),
+        )
+        r = GrammarRenumberer(compile_grammar(patterns))
+        assert r.process_token("<ab>ab</> <ab>cd</> {7}") == "[1] <ab>cd</> [2]"
+        assert r.get_source_list() == [(1, "pair:ab"), (2, "tag:7")]
+
+    @pytest.mark.parametrize("regex", [r"<(?P<key>\w+)>", r"<(\w+)>\1", r"<(?P<id>\w+)>\1"])
+    def test_unsupported_groups_are_rejected(self, regex):
+        with pytest.raises(ValueError, match="'bad'"):
+            compile_grammar((CitationPattern("bad", regex),))
+
+
+class TestSourceCatalogIndex:
+    """The integer catalog index behaves like the set[str] catalog."""
+
+    @pytest.mark.parametrize("ids", [
+        {f"source_{n}" for n in range(1, 40, 3)},  # dense: bitset
+        {"source_5", "source_100000", "source_987654321"},  # sparse: sorted array
+        set(),
+    ])
+    def test_membership_matches_set(self, ids):
+        index = SourceCatalogIndex(ids)
+        assert len(index) == len(ids)
+        probes = ids | {"source_0", "source_2", "source_05", "source_", "doc:5", "source_99999999999"}
+        for probe in probes:
+            assert (probe in index) == (probe in ids), probe
+
+    def test_rejects_non_canonical_catalog_ids(self):
+        with pytest.raises(ValueError):
+            SourceCatalogIndex(["source_007"])
+
+    @pytest.mark.parametrize("numbers", [[-1], [3, -8], [2**63], [1, 2**70]])
+    def test_rejects_out_of_range_numbers(self, numbers):
+        with pytest.raises(ValueError):
+            SourceCatalogIndex.from_numbers(numbers)
+        if min(numbers) >= 0:
+            with pytest.raises(ValueError):
+                SourceCatalogIndex(f"source_{n}" for n in numbers)
+
+    def test_accepts_largest_int64_number(self):
+        index = SourceCatalogIndex.from_numbers([0, 2**63 - 1])
+        assert index.contains_number(2**63 - 1) and f"source_{2**63 - 1}" in index
+
+    def test_shared_memory_round_trip(self):
+        for ids in ({"source_1", "source_4"}, {"source_3", "source_4000000"}):
+            index = SourceCatalogIndex(ids)
+            shm = index.share()
+            try:
+                attached = SourceCatalogIndex.attach(shm.name)
+                assert len(attached) == len(ids)
+                assert all(sid in attached for sid in ids)
+                assert "source_2" not in attached
+                attached.close()
+            finally:
+                shm.close()
+                shm.unlink()
+
+    def test_registry_and_multistream_use_index(self):
+        index = SourceCatalogIndex(["source_3", "source_7"])
+        r = StreamingRenumberer(source_catalog=index)
+        assert r.process_token("source_7 source_9 source_3.") + r.flush() == "[1] [?] [2]."
+        assert r.registry.invalid_log == ["source_9"]
+
+        engine = MultiStreamRenumberer(catalog=index)
+        assert engine.process_token("a", "source_9 source_3 source_03") == "[?] [1] [?]"
+        assert engine.get_source_list("a") == [(1, "source_3")]
+
+
+class TestFinalizer:
+    """Validation is incremental and keeps no emitted text."""
+
+    def test_reports_numbers_missing_from_source_list(self):
+        f = Finalizer()
+        for num in (1, 2, 2, 5):
+            f.observe(num)
+        assert f.check([(1, "source_3"), (2, "source_9")]) == [
+            "[5] referenced in text but not in source list"
+        ]
+
+    def test_renumberer_state_is_bounded_by_citations(self):
+        r = StreamingRenumberer()
+        for i in range(5000):
+            r.process_token(f"filler text {i} source_{i % 3} ")
+        r.flush()
+        assert len(r.get_source_list()) == 3
+        assert r.errors == []
+        assert not hasattr(r, "_emitted")
+        assert len(r._finalizer._referenced) == 3
+
+
+class TestCitationScanner:
+    """The state-machine scanner is a drop-in for both regex parsers."""
+
+    PIECES = ["s", "o", "u", "r", "c", "e", "_", "1", "0", "2", "x", " ", "\n", "source_", "sour", "ss"]
+
+    def test_matches_stream_parser_on_random_splits(self):
+        rng = random.Random(3)
+        for _ in range(2000):
+            text = "".join(rng.choice(self.PIECES) for _ in range(rng.randint(0, 30)))
+            tokens = _random_split(text, rng)
+            scanner, parser = CitationScanner(), StreamParser()
+            got, expected = [], []
+            for token in tokens:
+                got += scanner.feed(token)
+                expected += parser.feed(token)
+            got += scanner.flush()
+            expected += parser.flush()
+            assert _merged(got) == _merged(expected) == _regex_events(text), tokens
+
+    def test_hold_false_matches_per_token_regex(self):
+        rng = random.Random(4)
+        scanner = CitationScanner(hold=False)
+        for _ in range(2000):
+            token = "".join(rng.choice(self.PIECES) for _ in range(rng.randint(0, 12)))
+            assert _merged(scanner.feed(token)) == _regex_events(token)
+            assert scanner.pending == ""
+
+    def test_max_digits_bounds_pending_and_matches_capped_regex(self):
+        rng = random.Random(5)
+        for _ in range(2000):
+            text = "".join(rng.choice(self.PIECES) for _ in range(rng.randint(0, 30)))
+            tokens = _random_split(text, rng)
+            for hold in (True, False):
+                scanner = CitationScanner(hold=hold, max_digits=2)
+                got = []
+                for token in tokens:
+                    got += scanner.feed(token)
+                    assert len(scanner.pending) <= len("source_") + 2
+                got += scanner.flush()
+                if hold:
+                    assert _merged(got) == _regex_events(text, max_digits=2), tokens
+                else:
+                    expected = [e for t in tokens for e in _regex_events(t, max_digits=2)]
+                    assert _merged(got) == _merged(expected), tokens
+
+    def test_max_digits_releases_overlong_run_early(self):
+        scanner = CitationScanner(max_digits=3)
+        assert scanner.feed("a source_12") == [("text", "a ")]
+        assert scanner.feed("34") == [("text", "source_12"), ("text", "34")]
+        assert scanner.feed("56 source_7") == [("text", "56 ")]
+        assert scanner.flush() == [("cite", "source_7")]
+
+    def test_hold_false_renumberer_matches_reference(self):
+        tokens = ["See source_3", "source_", "7 and sour", "ce_3 source_10."]
+        r = StreamingRenumberer(parser=CitationScanner(hold=False))
+        out = [r.process_token(t) for t in tokens]
+        assert (out, r.get_source_list()) == _reference_run(tokens)
+
+
+class TestByteStreamingRenumberer:
+    """process_chunk renumbers raw UTF-8 chunks without decoding them."""
+
+    def test_split_citation_and_multibyte_characters(self):
+        data = "引用 source_12 と「source_3」、再び source_12。".encode()
+        r = ByteStreamingRenumberer()
+        # Cut inside multi-byte characters and inside the citations.
+        chunks = [data[:4], data[4:13], data[13:15], data[15:31], memoryview(data)[31:]]
+        out = b"".join(r.process_chunk(c) for c in chunks) + r.flush()
+        assert out.decode() == "引用 [1] と「[2]」、再び [1]。"
+        assert r.get_source_list() == [(1, "source_12"), (2, "source_3")]
+
+    def test_matches_str_renumberer_on_random_chunks(self):
+        rng = random.Random(5)
+        pieces = ["source_", "sour", "ce_", "7", "42", "é", "日本", " ", "s"]
+        for _ in range(500):
+            text = "".join(rng.choice(pieces) for _ in range(rng.randint(0, 20)))
+            chunks = _random_split(text.encode(), rng)
+            r, ref = ByteStreamingRenumberer(), StreamingRenumberer()
+            out = b"".join(r.process_chunk(c) for c in chunks) + r.flush()
+            assert out.decode() == ref.process_token(text) + ref.flush()
+            assert r.get_source_list() == ref.get_source_list()
+
+    def test_release_pending_returns_bytes(self):
+        r = ByteStreamingRenumberer()
+        assert r.process_chunk(b"x sour") == b"x "
+        assert r.release_pending() == b"sour"
+        assert r.release_pending() == b""
+
+    def test_chunk_without_citations_is_not_copied(self):
+        r = ByteStreamingRenumberer()
+        chunk = "plain text, no citations here.".encode()
+        assert r.process_chunk(chunk) is chunk
+
+
+class TestCheckpoint:
+    """A restored checkpoint continues the stream exactly where it stopped."""
+
+    TOKENS = ["Per source_4 and sou", "rce_17, ", "also source_", "4 and source_1", "2.", " done"]
+
+    @pytest.mark.parametrize("factory", [
+        StreamingRenumberer,
+        lambda: StreamingRenumberer(parser=StreamParser()),
+        lambda: StreamingRenumberer(parser=CitationScanner(hold=False)),
+    ])
+    def test_resume_matches_uninterrupted_stream(self, factory):
+        full = factory()
+        expected = [full.process_token(t) for t in self.TOKENS] + [full.flush()]
+
+        for cut in range(len(self.TOKENS) + 1):
+            r = factory()
+            out = [r.process_token(t) for t in self.TOKENS[:cut]]
+            restored = type(r).from_checkpoint(r.checkpoint())
+            assert restored.token_offset == cut
+            out += [restored.process_token(t) for t in self.TOKENS[restored.token_offset:]]
+            out.append(restored.flush())
+            assert out == expected
+            assert restored.get_source_list() == full.get_source_list()
+
+    def test_bytes_mode_resume(self):
+        chunks = [t.encode() for t in self.TOKENS]
+        full = ByteStreamingRenumberer()
+        expected = b"".join(full.process_chunk(c) for c in chunks) + full.flush()
+
+        r = ByteStreamingRenumberer()
+        out = b"".join(r.process_chunk(c) for c in chunks[:3])
+        restored = ByteStreamingRenumberer.from_checkpoint(r.checkpoint())
+        out += b"".join(restored.process_chunk(c) for c in chunks[3:]) + restored.flush()
+        assert out == expected
+        with pytest.raises(ValueError):
+            StreamingRenumberer.from_checkpoint(r.checkpoint())
+
+    def test_max_digits_is_restored(self):
+        tokens = ["see source_12345", "678 and source_2 ", "end"]
+        full = StreamingRenumberer(parser=CitationScanner(max_digits=3))
+        expected = [full.process_token(t) for t in tokens] + [full.flush()]
+
+        r = StreamingRenumberer(parser=CitationScanner(max_digits=3))
+        out = [r.process_token(tokens[0])]  # ends in the skip state
+        data = r.checkpoint()
+        restored = StreamingRenumberer.from_checkpoint(data)
+        assert restored._parser.max_digits == 3
+        out += [restored.process_token(t) for t in tokens[1:]] + [restored.flush()]
+        assert out == expected
+        assert StreamingRenumberer.from_checkpoint(data, max_digits=3)._parser.max_digits == 3
+        with pytest.raises(ValueError):
+            StreamingRenumberer.from_checkpoint(data, max_digits=8)
+
+    def test_checkpoint_is_compact(self):
+        r = StreamingRenumberer()
+        for n in range(1, 21):
+            r.process_token(f"claim source_{n}. ")
+        assert len(r.checkpoint()) < 100
+
+    def test_malformed_checkpoint_is_rejected(self):
+        data = StreamingRenumberer().checkpoint()
+        with pytest.raises(ValueError):
+            StreamingRenumberer.from_checkpoint(data[:-1] + b"x" + data[-1:])
+        with pytest.raises(ValueError):
+            StreamingRenumberer.from_checkpoint(b"XXXX" + data[4:])
+        # parser_kind and scan_state follow the magic and version bytes.
+        with pytest.raises(ValueError):
+            StreamingRenumberer.from_checkpoint(data[:5] + b"\x07" + data[6:])
+        with pytest.raises(ValueError):
+            StreamingRenumberer.from_checkpoint(data[:7] + b"\x09" + data[8:])
+
+    def test_large_token_offset_round_trips(self):
+        state = CheckpointState(0, False, 0, 1 << 40, b"", b"", ["source_3"])
+        assert decode_checkpoint(encode_checkpoint(state)).token_offset == 1 << 40
+        state.token_offset = 1 << 64
+        with pytest.raises(ValueError):
+            encode_checkpoint(state)
+
+    def test_resume_into_shared_registry(self):
+        shared = SharedCitationRegistry()
+        a, b = StreamingRenumberer(registry=shared), StreamingRenumberer(registry=shared)
+        a.process_token("source_4 ")
+        data = a.checkpoint()
+        b.process_token("source_9 ")
+
+        resumed = StreamingRenumberer.from_checkpoint(data, registry=shared)
+        assert resumed.registry is shared
+        assert resumed.process_token("source_9 source_4 ") == "[2] [1] "
+        with pytest.raises(ValueError):
+            StreamingRenumberer.from_checkpoint(data, registry=SharedCitationRegistry())
+
+    def test_cache_evicts_least_recently_used(self):
+        cache = CheckpointCache(max_entries=2)
+        cache.put("a", b"1")
+        cache.put("b", b"22")
+        assert cache.get("a") == b"1"
+        cache.put("c", b"333")
+        assert cache.get("b") is None
+        assert (len(cache), cache.nbytes) == (2, 4)
+        assert cache.pop("a") == b"1"
+        assert cache.nbytes == 3
+
+    def test_cache_respects_byte_budget(self):
+        cache = CheckpointCache(max_bytes=5)
+        cache.put("a", b"123")
+        cache.put("b", b"456")
+        assert cache.get("a") is None
+        assert cache.nbytes == 3
+
+
+async def _agen(tokens):
+    for token in tokens:
+        yield token
+
+
+class TestAsyncCitationStream:
+    """The async adapter yields renumbered chunks and finalizes at the end."""
+
+    def test_yields_chunks_and_final_source_list(self):
+        async def run():
+            stream = AsyncCitationStream(_agen(["A source_7", " B sour", "ce_2 C source_7"]))
+            chunks = [chunk async for chunk in stream]
+            return chunks, stream.source_list
+
+        chunks, sources = asyncio.run(run())
+        assert "".join(chunks) == "A [1] B [2] C [1]"
+        assert "" not in chunks
+        assert sources == [(1, "source_7"), (2, "source_2")]
+
+    def test_held_back_prefix_flushes_on_close(self):
+        async def run():
+            stream = AsyncCitationStream(_agen(["the end of s"]))
+            return [chunk async for chunk in stream], stream.source_list
+
+        chunks, sources = asyncio.run(run())
+        assert chunks == ["the end of ", "s"]
+        assert sources == []
+
+    def test_source_list_unavailable_before_end(self):
+        stream = AsyncCitationStream(_agen([]))
+        with pytest.raises(RuntimeError):
+            stream.source_list
+
+    def test_upstream_is_pulled_on_demand(self):
+        pulled = []
+
+        async def tokens():
+            for t in ["one ", "two ", "three"]:
+                pulled.append(t)
+                yield t
+
+        async def run():
+            it = aiter(AsyncCitationStream(tokens()))
+            first = await anext(it)
+            snapshot = list(pulled)
+            await it.aclose()
+            return first, snapshot
+
+        first, snapshot = asyncio.run(run())
+        assert first == "one "
+        assert snapshot == ["one "]
+
+
+class TestRenumberingService:
+    """Streams sent through the process-pool service match the reference."""
+
+    def test_sharded_streams_match_reference(self, tmp_path):
+        streams = {
+            "a": ["See source_7", " and sour", "ce_2."],
+            "b": ["source_2 then source_", "9 and source_2"],
+            "c": ["no citations here"],
+        }
+
+        async def run():
+            path = str(tmp_path / "cs1.sock")
+            service = RenumberingService(path, n_workers=2)
+            await service.start()
+            try:
+                client = await ServiceClient.connect(path)
+                for stream_id, tokens in streams.items():
+                    for token in tokens:
+                        client.send_token(stream_id, token)
+                    client.close_stream(stream_id)
+                await client.drain()
+                outputs = {stream_id: [] for stream_id in streams}
+                sources = {}
+                while len(sources) < len(streams):
+                    kind, stream_id, body = await client.receive()
+                    if kind == TEXT:
+                        outputs[stream_id].append(body)
+                    else:
+                        sources[stream_id] = body
+                await client.close()
+            finally:
+                await service.close()
+            return outputs, sources
+
+        outputs, sources = asyncio.run(run())
+        for stream_id, tokens in streams.items():
+            assert (outputs[stream_id], sources[stream_id]) == _reference_run(tokens)
+
+    def test_disconnected_stream_does_not_leak_into_reused_id(self, tmp_path):
+        async def run():
+            path = str(tmp_path / "cs1.sock")
+            service = RenumberingService(path, n_workers=1)
+            await service.start()
+            try:
+                first = await ServiceClient.connect(path)
+                first.send_token("chat-1", "see source_5")
+                assert await first.receive() == (TEXT, "chat-1", "see [1]")
+                await first.close()  # no CLOSE frame for chat-1
+
+                second = await ServiceClient.connect(path)
+                second.send_token("chat-1", "see source_9")
+                second.close_stream("chat-1")
+                replies = [await second.receive(), await second.receive()]
+                await second.close()
+            finally:
+                await service.close()
+            return replies
+
+        (_, _, text), (_, _, sources) = asyncio.run(run())
+        assert text == "see [1]"
+        assert sources == [(1, "source_9")]
+
+    def test_dead_worker_fails_requests(self, tmp_path):
+        async def run():
+            path = str(tmp_path / "cs1.sock")
+            service = RenumberingService(path, n_workers=1)
+            await service.start()
+            try:
+                client = await ServiceClient.connect(path)
+                worker = service._workers[0]
+                worker.process.kill()
+                worker.process.join()
+                client.send_token("s", "see source_1")
+                with pytest.raises(ServiceError):
+                    await asyncio.wait_for(client.receive(), timeout=5)
+                await client.close()
+            finally:
+                await service.close()
+
+        asyncio.run(run())
+
+    def test_close_with_connected_client(self, tmp_path):
+        async def run():
+            path = str(tmp_path / "cs1.sock")
+            service = RenumberingService(path, n_workers=2)
+            await service.start()
+            client = await ServiceClient.connect(path)
+            client.send_token("chat-1", "see source_5")
+            await client.drain()
+            await asyncio.sleep(0.05)
+            await asyncio.wait_for(service.close(), timeout=10)
+            with pytest.raises((asyncio.IncompleteReadError, ConnectionError)):
+                while True:
+                    await client.receive()
+            await client.close()
+            return service
+
+        service = asyncio.run(run())
+        assert service._workers == [] and service._writers == {}
+
+    def test_shard_is_stable(self):
+        assert shard_of("stream-1", 4) == shard_of("stream-1", 4)
+        assert {shard_of(f"s{i}", 4) for i in range(64)} == {0, 1, 2, 3}
+
+
+class TestInstrumentedRenumberer:
+    """Profiling leaves output unchanged and accounts for held-back text."""
+
+    def test_output_matches_uninstrumented(self):
+        tokens = ["A source_7", " B sour", "ce_2 C source_7", " end s"]
+        plain, profiled = StreamingRenumberer(), InstrumentedRenumberer()
+        for r in (plain, profiled):
+            r.out = "".join(r.process_token(t) for t in tokens) + r.flush()
+        assert profiled.out == plain.out
+        assert profiled.get_source_list() == plain.get_source_list()
+
+    def test_counts_and_held_back_characters(self):
+        r = InstrumentedRenumberer()
+        r.process_token("A source_7 B sour")   # holds back "sour"
+        r.process_token("ce_2 C source_")       # releases "sour", holds "source_"
+        r.process_token("7 end")                 # releases "source_"
+        r.flush()
+        stats = r.stats()
+        assert (stats.tokens, stats.citations, stats.distinct_sources) == (3, 3, 2)
+        assert stats.max_pending == 7
+        assert stats.delayed_chars == 4 + 7
+        assert stats.max_delay_ns > 0 and stats.delay_ns >= stats.max_delay_ns
+        assert min(stats.scan_ns, stats.alloc_ns, stats.render_ns) >= 0
+
+    def test_collector_aggregates_streams(self):
+        collector = StatsCollector()
+        a = InstrumentedRenumberer(collector=collector)
+        b = InstrumentedRenumberer(collector=collector)
+        a.process_token("source_1 source_2 s")
+        b.process_token("source_3 sour")
+        total = collector.snapshot()
+        assert (total.streams, total.tokens, total.citations, total.distinct_sources) == (2, 2, 3, 3)
+        assert total.max_pending == 4
+
+    def test_collector_keeps_only_live_streams(self):
+        collector = StatsCollector()
+        a = InstrumentedRenumberer(collector=collector)
+        a.process_token("source_1 ")
+        for _ in range(100):
+            InstrumentedRenumberer(collector=collector).process_token("source_2 x")
+        a.reset()
+        a.process_token("source_3 ")
+        assert len(collector) == 1
+        total = collector.snapshot()
+        assert (total.streams, total.tokens, total.citations) == (102, 102, 102)
+
+    def test_event_and_release_paths_are_tracked(self):
+        plain, profiled = StreamingRenumberer(), InstrumentedRenumberer()
+        for r in (plain, profiled):
+            r.out = [
+                r.process_token_events(""),
+                r.process_token("sour1ce_"),
+                r.process_token_events("sssource_3"),
+                r.release_pending(),
+                r.process_token_events("sour"),
+                r.process_token(""),
+                r.release_pending(),
+                r.flush_events(),
+            ]
+        assert profiled.out == plain.out
+        stats = profiled.stats()
+        assert stats.tokens == 5
+        assert stats.citations == 1
+        assert 0 < stats.delayed_chars <= len("sour1ce_sssource_3sour")
+        assert profiled._held == 0 and not profiled._arrivals
+
+
+async def _stalling(tokens, stall_after, stall):
+    for i, token in enumerate(tokens):
+        if i == stall_after:
+            await asyncio.sleep(stall)
+        yield token
+
+
+class TestDisplayDeadline:
+    """Held-back prefixes are released when the model stalls past the deadline."""
+
+    def test_prefix_released_as_literal_after_deadline(self):
+        async def run():
+            stream = AsyncCitationStream(
+                _stalling(["the end of s", "ome text source_3"], 1, 0.05), display_deadline=0.01
+            )
+            return [chunk async for chunk in stream], stream
+
+        chunks, stream = asyncio.run(run())
+        assert chunks[:2] == ["the end of ", "s"]
+        assert "".join(chunks) == "the end of some text [1]"
+        assert stream.source_list == [(1, "source_3")]
+        assert (stream.metrics.deadline_flushes, stream.metrics.released_chars) == (1, 1)
+        assert stream.metrics.max_hold >= 0.01
+
+    def test_citation_with_digits_is_not_released(self):
+        async def run():
+            stream = AsyncCitationStream(
+                _stalling(["see source_1", "2 here"], 1, 0.03), display_deadline=0.005
+            )
+            return [chunk async for chunk in stream], stream
+
+        chunks, stream = asyncio.run(run())
+        assert "".join(chunks) == "see [1] here"
+        assert stream.source_list == [(1, "source_12")]
+        assert stream.metrics.deadline_flushes == 0
+        assert stream.metrics.max_hold >= 0.03
+
+    def test_fast_tokens_are_unaffected(self):
+        tokens = ["A sour", "ce_7 B s", "ource_2", " C"]
+
+        async def run():
+            stream = AsyncCitationStream(_agen(tokens), display_deadline=1.0)
+            return [chunk async for chunk in stream]
+
+        assert "".join(asyncio.run(run())) == "A [1] B [2] C"
+
+    def test_release_pending_keeps_digit_runs(self):
+        for parser in (CitationScanner(), StreamParser()):
+            r = StreamingRenumberer(parser=parser)
+            assert r.process_token("x sour") == "x "
+            assert r.release_pending() == "sour"
+            assert r.process_token("ce_4 source_5") == "ce_4 "
+            assert r.release_pending() == ""
+            assert r.held_back == "source_5"
+
+
+class _MemoryStore:
+    """In-memory stand-in for the document store."""
+
+    def __init__(self, docs):
+        self.docs = docs
+        self.batches = []
+
+    async def resolve(self, source_ids):
+        self.batches.append(list(source_ids))
+        await asyncio.sleep(0)
+        return {sid: self.docs[sid] for sid in source_ids if sid in self.docs}
+
+
+class TestMetadataPrefetch:
+    """Lookups start at allocation, batched and deduplicated across streams."""
+
+    DOCS = {f"source_{i}": {"title": f"Doc {i}"} for i in range(10)}
+
+    def test_concurrent_streams_share_batched_lookups(self):
+        store = _MemoryStore(self.DOCS)
+
+        async def run():
+            prefetcher = MetadataPrefetcher(store.resolve)
+            streams = [
+                AsyncCitationStream(_agen(["A source_1 B sour", "ce_2", " C source_1"]), prefetcher=prefetcher),
+                AsyncCitationStream(_agen(["source_2 and source_3 ", "source_42"]), prefetcher=prefetcher),
+            ]
+
+            async def consume(stream):
+                return "".join([chunk async for chunk in stream])
+
+            texts = await asyncio.gather(*(consume(s) for s in streams))
+            return texts, [s.enriched_source_list for s in streams]
+
+        texts, enriched = asyncio.run(run())
+        assert texts == ["A [1] B [2] C [1]", "[1] and [2] [3]"]
+        assert enriched[0] == [(1, "source_1", {"title": "Doc 1"}), (2, "source_2", {"title": "Doc 2"})]
+        assert enriched[1][2] == (3, "source_42", None)
+        requested = [sid for batch in store.batches for sid in batch]
+        assert sorted(requested) == ["source_1", "source_2", "source_3", "source_42"]
+        assert len(store.batches) < len(requested)
+
+    def test_lookup_starts_before_stream_ends(self):
+        store = _MemoryStore(self.DOCS)
+
+        async def run():
+            prefetcher = MetadataPrefetcher(store.resolve)
+            it = aiter(AsyncCitationStream(_agen(["see source_5 ", "more text"]), prefetcher=prefetcher))
+            await anext(it)
+            await asyncio.sleep(0.01)
+            seen = list(store.batches)
+            await it.aclose()
+            return seen
+
+        assert asyncio.run(run()) == [["source_5"]]
+
+    def test_failed_batches_are_retried(self, caplog):
+        calls = []
+
+        async def flaky(source_ids):
+            calls.append(list(source_ids))
+            if len(calls) == 1:
+                raise OSError("store unavailable")
+            return {sid: {"ok": True} for sid in source_ids}
+
+        async def run():
+            prefetcher = MetadataPrefetcher(flaky, max_batch=1)
+            first = await prefetcher.resolve(["source_1"])
+            second = await prefetcher.resolve(["source_1", "source_2"])
+            return first, second
+
+        first, second = asyncio.run(run())
+        assert first == [None]
+        assert second == [{"ok": True}, {"ok": True}]
+        assert calls == [["source_1"], ["source_1"], ["source_2"]]
+        [failure] = caplog.records
+        assert "source_1" in failure.getMessage()
+        assert isinstance(failure.exc_info[1], OSError)
+
+    def test_cancelled_batch_resolves_waiters(self):
+        started = []
+
+        async def slow(source_ids):
+            started.append(source_ids)
+            await asyncio.sleep(10)
+
+        async def run():
+            prefetcher = MetadataPrefetcher(slow)
+            waiter = asyncio.ensure_future(prefetcher.resolve(["source_1"]))
+            while not started:
+                await asyncio.sleep(0)
+            for task in list(prefetcher._tasks):
+                task.cancel()
+            return await asyncio.wait_for(waiter, timeout=1), "source_1" in prefetcher._futures
+
+        assert asyncio.run(run()) == ([None], False)
+
+    def test_enriched_list_requires_prefetcher(self):
+        async def run():
+            stream = AsyncCitationStream(_agen(["source_1"]))
+            [chunk async for chunk in stream]
+            return stream
+
+        with pytest.raises(RuntimeError):
+            asyncio.run(run()).enriched_source_list
+
+
+class TestStructuredEvents:
+    """process_token_events describes exactly what process_token renders."""
+
+    def test_events_render_like_process_token(self):
+        rng = random.Random(21)
+        pieces = TestCitationScanner.PIECES + ["source_1", "source_22"]
+        for _ in range(500):
+            text = "".join(rng.choice(pieces) for _ in range(rng.randint(0, 20)))
+            tokens = _random_split(text, rng)
+            for make_parser in (CitationScanner, StreamParser):
+                plain = StreamingRenumberer(parser=make_parser())
+                structured = StreamingRenumberer(parser=make_parser())
+                for token in tokens:
+                    events = structured.process_token_events(token)
+                    assert render_events(events) == plain.process_token(token), tokens
+                    for event in events:
+                        if isinstance(event, TextSpan):
+                            assert event.start < event.end
+                assert render_events(structured.flush_events()) == plain.flush()
+                assert structured.get_source_list() == plain.get_source_list()
+
+    def test_spans_reference_the_original_token(self):
+        r = StreamingRenumberer()
+        token = "Intro source_4 middle sour"
+        events = r.process_token_events(token)
+        assert events == [TextSpan(token, 0, 6), Citation(1, "source_4"), TextSpan(token, 14, 22)]
+        assert events[0].source is token
+        follow = "ce_9 end"
+        events = r.process_token_events(follow)
+        assert events == [Citation(2, "source_9"), TextSpan(follow, 4, 8)]
+
+    def test_catalog_rejection_has_no_number(self):
+        r = StreamingRenumberer(source_catalog={"source_1"})
+        events = r.process_token_events("source_5 x")
+        assert events[0] == Citation(None, "source_5")
+        assert render_events(events) == "[?] x"
+
+
+class TestSharedCitationRegistry:
+    """Parallel producers share one first-appearance numbering."""
+
+    def test_threads_agree_on_every_number(self):
+        registry = SharedCitationRegistry()
+        ids = [f"source_{i}" for i in range(200)]
+        barrier = threading.Barrier(8)
+        seen = []
+
+        def produce(seed):
+            order = ids[:]
+            random.Random(seed).shuffle(order)
+            barrier.wait()
+            seen.append({sid: registry.resolve_num(sid) for sid in order})
+
+        threads = [threading.Thread(target=produce, args=(i,)) for i in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert all(s == seen[0] for s in seen)
+        ordered = registry.get_ordered()
+        assert [num for num, _ in ordered] == list(range(1, 201))
+        assert dict((sid, num) for num, sid in ordered) == seen[0]
+
+    def test_reset_leaves_shared_registry_intact(self):
+        registry = SharedCitationRegistry()
+        a, b = StreamingRenumberer(registry=registry), StreamingRenumberer(registry=registry)
+        assert a.process_token("source_4 ") == "[1] "
+        assert b.process_token("source_8 ") == "[2] "
+        a.reset()
+        assert registry.get_ordered() == [(1, "source_4"), (2, "source_8")]
+        assert b.process_token("source_4 ") == "[1] "
+        assert a.process_token("source_8 ") == "[1] "
+        assert a.get_source_list() == [(1, "source_8")]
+        assert registry.get_ordered() == [(1, "source_4"), (2, "source_8")]
+
+    def test_reset_detaches_unless_registry_is_passed(self):
+        catalog = {"source_4", "source_8"}
+        registry = SharedCitationRegistry(source_catalog=catalog)
+        a = StreamingRenumberer(registry=registry)
+        a.process_token("source_4 ")
+
+        a.reset()
+        assert a.registry is not registry
+        assert a.registry.source_catalog is catalog
+        assert a.process_token("source_9 ") == "[?] "
+
+        a.reset(registry=registry)
+        assert a.registry is registry
+        assert a.process_token("source_8 ") == "[2] "
+        a.reset(registry=registry)
+        assert registry.get_ordered() == [(1, "source_4"), (2, "source_8")]
+
+    def test_async_candidates_share_numbering(self):
+        registry = SharedCitationRegistry()
+        answers = [["A source_3 ", "then source_1"], ["B source_1 ", "and source_", "3 and source_9"]]
+
+        async def candidate(tokens):
+            r = StreamingRenumberer(registry=registry)
+            out = []
+            for token in tokens:
+                out.append(r.process_token(token))
+                await asyncio.sleep(0)
+            return "".join(out) + r.flush()
+
+        async def run():
+            return await asyncio.gather(*(candidate(t) for t in answers))
+
+        first, second = asyncio.run(run())
+        assert (first, second) == ("A [1] then [2]", "B [2] and [1] and [3]")
+        assert registry.get_ordered() == [(1, "source_3"), (2, "source_1"), (3, "source_9")]
+
+    def test_catalog_belongs_to_the_registry(self):
+        registry = SharedCitationRegistry(source_catalog={"source_1"})
+        assert StreamingRenumberer(registry=registry).process_token("source_2 ") == "[?] "
+        with pytest.raises(ValueError):
+            StreamingRenumberer(source_catalog={"source_1"}, registry=registry)
+
+
+class TestBulkRenumbering:
+    """JSONL corpora are renumbered per record, in order, across workers."""
+
+    def test_corpus_matches_reference_per_record(self, tmp_path):
+        rng = random.Random(22)
+        pieces = ["source_1", "source_12", "source_007", " text ", "引用", "sour", "\n"]
+        records = [
+            {"id": i, "text": "".join(rng.choice(pieces) for _ in range(rng.randint(0, 12)))}
+            for i in range(300)
+        ]
+        src = tmp_path / "in.jsonl"
+        lines = [json.dumps(r, ensure_ascii=False) for r in records]
+        lines.insert(10, "")
+        src.write_text("\n".join(lines), encoding="utf-8")
+        dst = tmp_path / "out.jsonl"
+
+        stats = renumber_jsonl(str(src), str(dst), workers=2, chunk_bytes=512)
+
+        out_lines = dst.read_text(encoding="utf-8").split("\n")
+        assert out_lines[10] == "" and out_lines[-1] == ""
+        rendered = [json.loads(line) for line in out_lines if line]
+        assert stats.records == len(records) + 1
+        assert [r["id"] for r in rendered] == list(range(300))
+        for record, got in zip(records, rendered):
+            (text,), sources = _reference_run([record["text"]])
+            assert got["text"] == text
+            assert [tuple(s) for s in got["sources"]] == sources
+
+    def test_chunks_end_on_record_boundaries(self):
+        data = b'{"a": 1}\n{"b": 22}\n{"c": 333}'
+        chunks = record_chunks(data, 4)
+        assert chunks == [(0, 9), (9, 19), (19, len(data))]
+        assert record_chunks(data, 1000) == [(0, len(data))]
+
+    def test_chunk_size_must_be_positive(self, tmp_path):
+        src = tmp_path / "in.jsonl"
+        src.write_text('\n{"text": "source_1"}\n')
+        for chunk_bytes in (0, -1):
+            with pytest.raises(ValueError, match="chunk_bytes"):
+                record_chunks(src.read_bytes(), chunk_bytes)
+            with pytest.raises(ValueError, match="chunk_bytes"):
+                renumber_jsonl(str(src), str(tmp_path / "out.jsonl"), workers=1, chunk_bytes=chunk_bytes)
+
+    def test_invalid_record_is_reported(self, tmp_path):
+        src = tmp_path / "bad.jsonl"
+        src.write_text('{"text": "source_1"}\nnot json\n')
+        with pytest.raises(ValueError, match="byte 21"):
+            renumber_jsonl(str(src), str(tmp_path / "out.jsonl"), workers=1)
+
+
+def _streaming_app(chunks, content_type=b"text/event-stream", extra_headers=()):
+    async def app(scope, receive, send):
+        headers = [(b"content-type", content_type), (b"content-length", b"999"), *extra_headers]
+        await send({"type": "http.response.start", "status": 200, "headers": headers})
+        for i, chunk in enumerate(chunks):
+            await send({"type": "http.response.body", "body": chunk, "more_body": i < len(chunks) - 1})
+    return app
+
+
+async def _asgi_request(app):
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    await app({"type": "http", "method": "GET", "path": "/"}, receive, send)
+    return messages
+
+
+class TestCitationRenumberMiddleware:
+    """Streaming bodies are renumbered chunk by chunk, with a sources trailer."""
+
+    def test_sse_stream_is_renumbered_with_trailer(self):
+        chunks = [b"data: see source_7 and sour", b"ce_2\n\n", b"data: again source_7\n\n"]
+        app = CitationRenumberMiddleware(_streaming_app(chunks))
+        messages = asyncio.run(_asgi_request(app))
+        start, *bodies = messages
+        assert (b"content-length", b"999") not in start["headers"]
+        assert [m["body"] for m in bodies] == [
+            b"data: see [1] and ",
+            b"[2]\n\n",
+            b'data: again [1]\n\nevent: sources\ndata: [[1, "source_7"], [2, "source_2"]]\n\n',
+        ]
+        assert [m["more_body"] for m in bodies] == [True, True, False]
+
+    def test_pooled_renumberers_start_fresh(self):
+        app = CitationRenumberMiddleware(_streaming_app([b"source_5 ", b"source_9"], b"text/plain"))
+        first = asyncio.run(_asgi_request(app))
+        second = asyncio.run(_asgi_request(app))
+        assert b"".join(m["body"] for m in first[1:]) == b"".join(m["body"] for m in second[1:]) == b"[1] [2]"
+        assert len(app._pool) == 1
+
+    def test_other_responses_pass_through(self):
+        for content_type, extra in ((b"application/json", ()), (b"text/plain", ((b"content-encoding", b"gzip"),))):
+            app = CitationRenumberMiddleware(_streaming_app([b"source_3"], content_type, extra))
+            messages = asyncio.run(_asgi_request(app))
+            assert messages[1]["body"] == b"source_3"
+            assert (b"content-length", b"999") in messages[0]["headers"]
+
+
+class TestTraces:
+    """Recorded token-stream traces round-trip and reject malformed lines."""
+
+    def test_round_trip(self, tmp_path):
+        tokens = [TraceToken(0.0, "see sour"), TraceToken(0.0125, "ce_3 \u00e9"), TraceToken(0.5, "")]
+        path = tmp_path / "trace.jsonl"
+        save_trace(path, tokens, {"model": "m"})
+        assert load_trace(path) == tokens
+
+        recorder = TraceRecorder()
+        for token in ("a", "b"):
+            recorder.add(token)
+        recorder.save(path)
+        loaded = load_trace(path)
+        assert [t.token for t in loaded] == ["a", "b"]
+        assert loaded[0].t == 0.0 <= loaded[1].t
+
+    @pytest.mark.parametrize("line", [
+        '{"t": 0.1}',
+        '{"t": 0.2, "token": "cut',
+        '[0.2, "x"]',
+        '{"t": "soon", "token": "x"}',
+        '{"t": 0.2, "token": 7}',
+        '{"t": 0.05, "token": "late"}',
+    ])
+    def test_malformed_line_is_rejected(self, tmp_path, line):
+        path = tmp_path / "trace.jsonl"
+        path.write_text('{"t": 0.1, "token": "ok"}\n' + line + "\n")
+        with pytest.raises(ValueError, match=":2:"):
+            load_trace(path)
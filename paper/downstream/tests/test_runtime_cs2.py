@@ -0,0 +1,74 @@
+"""Tests for the CS2 runtime components under paper/downstream/runtime/.
+
+Unlike test_cs2.py these do not load an implementation from
+DOWNSTREAM_IMPL_PATH; each runtime component is exercised directly and
+compared with ReferenceSessionManager.
+"""
+
+import random
+
+from reference_cs2 import ReferenceSessionManager
+from runtime.cs2_sessions import IndexedSessionManager
+
+
+class TestIndexedSessionManager:
+    """The per-user index stays consistent with the token store."""
+
+    def test_user_revocation_is_scoped_to_tenant_and_user(self):
+        sm = IndexedSessionManager()
+        mine = [sm.create_session("t1", "u1", d) for d in ("phone", "laptop", "tablet")]
+        other_user = sm.create_session("t1", "u2", "phone")
+        other_tenant = sm.create_session("t2", "u1", "phone")
+
+        assert sm.invalidate_user_sessions("t1", "u1") == 3
+        assert all(sm.validate_session(t) is None for t in mine)
+        assert sm.validate_session(other_user) == {"tenant_id": "t1", "user_id": "u2", "device_id": "phone"}
+        assert sm.validate_session(other_tenant) is not None
+        assert sm.invalidate_user_sessions("t1", "u1") == 0
+        assert len(sm) == 2
+
+    def test_single_invalidation_updates_index(self):
+        sm = IndexedSessionManager()
+        t1 = sm.create_session("t1", "u1", "phone")
+        t2 = sm.create_session("t1", "u1", "laptop")
+
+        assert sm.invalidate_session(t1) is True
+        assert sm.invalidate_session(t1) is False
+        assert sm.user_session_count("t1", "u1") == 1
+        assert sm.invalidate_user_sessions("t1", "u1") == 1
+        assert sm.validate_session(t2) is None
+        assert sm.invalidate_session(t2) is False
+        assert sm._by_user == {}
+
+    def test_mutating_validated_session_does_not_desync_index(self):
+        sm = IndexedSessionManager()
+        token = sm.create_session("t1", "u1", "phone")
+        other = sm.create_session("t1", "u2", "phone")
+        sm.validate_session(token)["user_id"] = "u2"
+        assert sm.invalidate_session(token) is True
+        assert sm.user_session_count("t1", "u1") == 0
+        assert sm.user_session_count("t1", "u2") == 1
+        assert sm.invalidate_user_sessions("t1", "u2") == 1
+        assert sm.validate_session(other) is None
+
+    def test_random_operations_match_reference(self):
+        rng = random.Random(0)
+        indexed, reference = IndexedSessionManager(), ReferenceSessionManager()
+        # Tokens are random, so pair them up by creation order.
+        pairs: list[tuple[str, str]] = []
+        for _ in range(2000):
+            op = rng.random()
+            tenant, user = f"t{rng.randint(1, 3)}", f"u{rng.randint(1, 5)}"
+            if op < 0.6:
+                device = f"d{rng.randint(1, 4)}"
+                pairs.append((indexed.create_session(tenant, user, device),
+                               reference.create_session(tenant, user, device)))
+            elif op < 0.85 and pairs:
+                a, b = rng.choice(pairs)
+                assert indexed.invalidate_session(a) == reference.invalidate_session(b)
+            else:
+                revoked = indexed.invalidate_user_sessions(tenant, user)
+                assert revoked == reference.invalidate_user_sessions(tenant, user)
+        for a, b in pairs:
+            assert indexed.validate_session(a) == reference.validate_session(b)
+        assert len(indexed) == len(reference._sessions)